@@ -0,0 +1,88 @@
+"""Concurrent login throughput: users.authenticate vs. the old read-then-write path.
+
+    python -m benchmarks.bench_auth --threads 8 --logins 200
+
+Argon2 is turned down to its minimum so the numbers reflect the database
+work (and SQLite's writer lock) rather than hashing.
+"""
+from __future__ import annotations
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmp = tempfile.mkdtemp(prefix="bench-auth-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("ARGON2_MEMORY_COST", "1024")
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ.setdefault("HASH_WORKERS", "0")
+os.environ.setdefault("HASH_QUEUE_MAX", "1024")
+
+import datetime  # noqa: E402
+from sqlalchemy import select, update  # noqa: E402
+from flask_books_xss.db import SessionLocal  # noqa: E402
+from flask_books_xss.models.user import User  # noqa: E402
+from flask_books_xss.schema import init_db  # noqa: E402
+from flask_books_xss.security import hash_password, verify_password  # noqa: E402
+from flask_books_xss.users import authenticate, MAX_FAILED_ATTEMPTS, LOCK_MINUTES  # noqa: E402
+from flask_books_xss.utils.time import utc_now  # noqa: E402
+
+PASSWORD = "correct horse battery"
+
+
+def legacy_authenticate(email: str, password: str):
+    """The pre-refactor implementation: SELECT, then UPDATE + commit on every attempt."""
+    now = utc_now()
+    with SessionLocal() as s:
+        u = s.execute(select(User).filter_by(email=email)).scalar_one_or_none()
+        if not u:
+            return None
+        if not verify_password(u.password_hash, password):
+            new_failed = (u.failed_attempts or 0) + 1
+            locked_until = now + datetime.timedelta(minutes=LOCK_MINUTES) if new_failed >= MAX_FAILED_ATTEMPTS else None
+            s.execute(update(User).where(User.id == u.id).values(
+                failed_attempts=new_failed, locked_until=locked_until or u.locked_until, updated_at=now))
+            s.commit()
+            return None
+        s.execute(update(User).where(User.id == u.id).values(failed_attempts=0, locked_until=None, updated_at=now))
+        s.commit()
+        return u
+
+
+def seed(n_users: int) -> list[str]:
+    init_db()
+    pw_hash = hash_password(PASSWORD)
+    emails = [f"user{i}@bench.test" for i in range(n_users)]
+    with SessionLocal() as s:
+        s.add_all(User(email=e, password_hash=pw_hash, failed_attempts=0) for e in emails)
+        s.commit()
+    return emails
+
+
+def run(fn, emails: list[str], threads: int, logins: int) -> float:
+    def worker(i: int) -> None:
+        for j in range(logins):
+            assert fn(emails[(i * logins + j) % len(emails)], PASSWORD)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return threads * logins / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--logins", type=int, default=200, help="Logins per thread.")
+    args = ap.parse_args()
+
+    emails = seed(args.users)
+    print(f"{args.threads} threads x {args.logins} successful logins, {args.users} users")
+    for name, fn in (("legacy", legacy_authenticate), ("authenticate", authenticate)):
+        print(f"{name:>14}: {run(fn, emails, args.threads, args.logins):8.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
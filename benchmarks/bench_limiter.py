@@ -0,0 +1,89 @@
+"""Rate limiter storage: per-check overhead and cross-process accuracy.
+
+    python -m benchmarks.bench_limiter --checks 20000 --workers 4
+    python -m benchmarks.bench_limiter --redis redis://localhost:6379/0
+
+For each storage it times `limiter.hit()` on fresh keys (admitted checks)
+and on one exhausted key (rejected checks). It then has --workers processes
+race for a single "100 per hour" limit: a shared storage admits exactly 100
+in total, memory:// admits 100 per process.
+"""
+from __future__ import annotations
+import argparse
+import multiprocessing as mp
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+
+from flask_books_xss.utils.limiter_storage import supported_strategies  # registers sqlite://
+
+
+def per_check(uri: str, strategy: str, checks: int) -> Dict[str, float]:
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    admit, reject = parse("1000000 per hour"), parse("1 per hour")
+    limiter.hit(reject, "flood")
+
+    def timed(fn) -> float:
+        samples: List[float] = []
+        for i in range(checks):
+            t0 = time.perf_counter()
+            fn(i)
+            samples.append(time.perf_counter() - t0)
+        return statistics.median(samples) * 1e6
+
+    return {
+        "admit_us": timed(lambda i: limiter.hit(admit, f"ip-{i}")),
+        "reject_us": timed(lambda i: limiter.hit(reject, "flood")),
+    }
+
+
+def _race(uri: str, strategy: str, attempts: int, out) -> None:
+    limiter = STRATEGIES[strategy](storage_from_string(uri))
+    item = parse("100 per hour")
+    out.put(sum(limiter.hit(item, "login", "203.0.113.7") for _ in range(attempts)))
+
+
+def admitted_across_processes(uri: str, strategy: str, workers: int, attempts: int) -> int:
+    ctx = mp.get_context("fork")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_race, args=(uri, strategy, attempts, out)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    total = sum(out.get() for _ in procs)
+    for p in procs:
+        p.join()
+    return total
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--checks", type=int, default=20000)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--attempts", type=int, default=500, help="Attempts per process in the race.")
+    # Every strategy both built-in storages implement (memory:// also has moving-window).
+    ap.add_argument("--strategy", default="sliding-window-counter",
+                    choices=sorted(set(supported_strategies("memory://")) & set(supported_strategies("sqlite://"))))
+    ap.add_argument("--redis", help="Also measure a Redis storage at this URI.")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-limiter-")
+    uris = ["memory://", f"sqlite:///{tmp}/ratelimit.db"]
+    if args.redis:
+        uris.append(args.redis)
+
+    print(f"strategy={args.strategy}  workers={args.workers}  limit=100/hour")
+    print(f"{'storage':<12} {'admit p50':>10} {'reject p50':>11} {'admitted':>9}")
+    for uri in uris:
+        r = per_check(uri, args.strategy, args.checks)
+        storage_from_string(uri).reset()
+        admitted = admitted_across_processes(uri, args.strategy, args.workers, args.attempts)
+        print(f"{uri.split(':')[0]:<12} {r['admit_us']:>8.1f}us {r['reject_us']:>9.1f}us {admitted:>9}")
+
+
+if __name__ == "__main__":
+    main()
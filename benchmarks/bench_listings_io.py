@@ -0,0 +1,109 @@
+"""Bulk listing import/export throughput (rows/s) and memory.
+
+    python -m benchmarks.bench_listings_io --rows 200000 --chunk-sizes 1,100,1000,5000
+
+Generates a JSON Lines and a CSV file of --rows listings, imports each at every
+chunk size into a fresh database, then exports the result in both formats.
+Peak RSS is reported after each step; with streaming it should stay flat as
+--rows grows. --baseline-rows also times the same data through
+create_listing() one row at a time for comparison.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench-io-")
+os.chdir(_tmp)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+os.environ.setdefault("PAGE_CACHE", "off")
+
+from sqlalchemy import delete  # noqa: E402
+from flask_books_xss.db import SessionLocal  # noqa: E402
+from flask_books_xss.listings import create_listing, export_listings, import_listings  # noqa: E402
+from flask_books_xss.models.listing import Listing  # noqa: E402
+from flask_books_xss.schema import init_db  # noqa: E402
+
+WORDS = "dune foundation hyperion neuromancer solaris ubik signed first edition paperback".split()
+MARKUP = ["<b>signed</b>", "<script>x</script>", "<a href='javascript:x'>link</a>", "&amp;"]
+
+
+def records(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        description = rnd.choices(WORDS, k=rnd.randint(0, 30))
+        if rnd.random() < 0.2:  # some rows carry markup and take the full bleach path
+            description.append(rnd.choice(MARKUP))
+        yield {
+            "title": " ".join(rnd.choices(WORDS, k=3)),
+            "description": " ".join(description),
+            "price": rnd.randint(0, 100_000),
+        }
+
+
+def write_inputs(n: int):
+    jsonl, csv_path = os.path.join(_tmp, "in.jsonl"), os.path.join(_tmp, "in.csv")
+    with open(jsonl, "w", encoding="utf-8") as fh:
+        for rec in records(n):
+            fh.write(json.dumps(rec) + "\n")
+    with open(csv_path, "w", encoding="utf-8", newline="") as fh:
+        w = csv.DictWriter(fh, fieldnames=["title", "description", "price"])
+        w.writeheader()
+        w.writerows(records(n))
+    return {"jsonl": jsonl, "csv": csv_path}
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def clear() -> None:
+    with SessionLocal() as s:
+        s.execute(delete(Listing))
+        s.commit()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--chunk-sizes", default="1,100,1000,5000")
+    ap.add_argument("--baseline-rows", type=int, default=2000,
+                    help="Rows to insert through create_listing() (0 to skip).")
+    args = ap.parse_args()
+    init_db()
+    inputs = write_inputs(args.rows)
+
+    print(f"{'step':<28} {'rows':>8} {'rows/s':>10} {'peak RSS':>10}")
+
+    def report(step: str, rows: int, seconds: float) -> None:
+        print(f"{step:<28} {rows:>8} {rows / seconds:>10.0f} {peak_rss_mib():>7.0f} MiB")
+
+    if args.baseline_rows:
+        t0 = time.perf_counter()
+        for rec in records(args.baseline_rows):
+            create_listing(user_id=None, **rec)
+        report("create_listing (per row)", args.baseline_rows, time.perf_counter() - t0)
+        clear()
+
+    for fmt, path in inputs.items():
+        for size in (int(x) for x in args.chunk_sizes.split(",")):
+            clear()
+            t0 = time.perf_counter()
+            with open(path, encoding="utf-8", newline="") as fh:
+                inserted, _ = import_listings(fh, fmt, chunk_size=size)
+            report(f"import {fmt} chunk={size}", inserted, time.perf_counter() - t0)
+
+    for fmt in ("jsonl", "csv"):
+        t0 = time.perf_counter()
+        with open(os.devnull, "w", encoding="utf-8", newline="") as fh:
+            n = export_listings(fh, fmt)
+        report(f"export {fmt}", n, time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    main()
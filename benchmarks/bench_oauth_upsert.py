@@ -0,0 +1,73 @@
+"""Parallel OAuth account upserts: correctness under contention, then throughput.
+
+    python -m benchmarks.bench_oauth_upsert --threads 16 --rounds 20
+
+Phase 1 fires --threads concurrent first-time logins for the *same* provider
+account, --rounds times over, and checks they all resolve to one user and
+one link. Phase 2 measures throughput over a mix of new and returning
+accounts. Exits non-zero if phase 1 finds duplicates or disagreement.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmp = tempfile.mkdtemp(prefix="bench-oauth-")
+os.chdir(_tmp)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/bench.db")
+
+from sqlalchemy import func, select  # noqa: E402
+from flask_books_xss.db import SessionLocal  # noqa: E402
+from flask_books_xss.models.user import OAuthAccount, User  # noqa: E402
+from flask_books_xss.oauth import upsert_oauth_account  # noqa: E402
+from flask_books_xss.schema import init_db  # noqa: E402
+
+
+def contend(account: int, threads: int) -> set:
+    barrier = threading.Barrier(threads)
+
+    def login(_):
+        barrier.wait()
+        return upsert_oauth_account("github", str(account), f"gh{account}@example.test", f"tok-{account}", None, None)
+
+    with ThreadPoolExecutor(threads) as pool:
+        return set(pool.map(login, range(threads)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--logins", type=int, default=2000, help="Upserts in the throughput phase.")
+    args = ap.parse_args()
+    init_db()
+
+    failures = 0
+    for account in range(args.rounds):
+        ids = contend(account, args.threads)
+        with SessionLocal() as s:
+            users = s.scalar(select(func.count()).select_from(User).where(User.email == f"gh{account}@example.test"))
+            links = s.scalar(select(func.count()).select_from(OAuthAccount)
+                             .where(OAuthAccount.provider_user_id == str(account)))
+        if len(ids) != 1 or users != 1 or links != 1:
+            failures += 1
+            print(f"account {account}: ids={ids} users={users} links={links}")
+    print(f"contention: {args.rounds} rounds x {args.threads} parallel callbacks, {failures} inconsistent")
+
+    def login(i: int) -> int:
+        account = 1_000_000 + i // 2  # every account logs in twice: create, then refresh
+        return upsert_oauth_account("github", str(account), f"gh{account}@example.test", f"tok-{i}", None, None)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        list(pool.map(login, range(args.logins)))
+    print(f"throughput: {args.logins / (time.perf_counter() - t0):.1f} upserts/s with {args.threads} threads")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Full-text search latency at scale: FTS5 search_listings() vs. LIKE '%q%'.
+
+    python -m benchmarks.bench_search --rows 1000000 --queries 200
+
+Seeds --rows listings with Zipf-distributed vocabulary (through the sync
+triggers, as a bulk import would), then times each query shape on page 1
+and a deep page. LIKE is timed on fewer queries since a rare word costs a
+full table scan. The database is kept between runs with --db to skip seeding.
+"""
+from __future__ import annotations
+import argparse
+import os
+import random
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="bench-search-")
+os.chdir(_tmp)
+
+ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+ap.add_argument("--rows", type=int, default=1_000_000)
+ap.add_argument("--queries", type=int, default=200, help="Timed queries per shape.")
+ap.add_argument("--like-queries", type=int, default=5)
+ap.add_argument("--db", help="Reuse (or create) this database file.")
+args = ap.parse_args()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{args.db or os.path.join(_tmp, 'bench.db')}")
+os.environ.setdefault("SQLITE_PROFILE", "production")
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+from flask_books_xss.db import SessionLocal, engine  # noqa: E402
+from flask_books_xss.models.listing import Listing  # noqa: E402
+from flask_books_xss.schema import init_db  # noqa: E402
+from flask_books_xss.search import search_listings  # noqa: E402
+from flask_books_xss.utils.time import utc_now  # noqa: E402
+
+VOCAB_SIZE = 20_000
+CHUNK = 10_000
+
+
+def vocabulary(rnd: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCAB_SIZE:
+        words.add("".join(rnd.choices(letters, k=rnd.randint(4, 10))))
+    words = sorted(words)
+    # Zipf: a few very common words, a long tail. Cumulative, so choices() doesn't re-sum per call.
+    cum, total = [], 0.0
+    for rank in range(len(words)):
+        total += 1 / (rank + 1)
+        cum.append(total)
+    return words, cum
+
+
+def seed(n: int, words, weights, rnd: random.Random) -> None:
+    now = utc_now()
+    t0 = time.perf_counter()
+    done = 0
+    while done < n:
+        size = min(CHUNK, n - done)
+        rows = [{
+            "user_id": None,
+            "title": " ".join(rnd.choices(words, cum_weights=weights, k=3)),
+            "description": " ".join(rnd.choices(words, cum_weights=weights, k=rnd.randint(5, 40))),
+            "price": rnd.randint(0, 100_000),
+            "created_at": now,
+        } for _ in range(size)]
+        with SessionLocal() as s:
+            s.connection().execute(insert(Listing.__table__), rows)
+            s.commit()
+        done += size
+    print(f"seeded {n} rows in {time.perf_counter() - t0:.1f}s (with FTS triggers)")
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1e3)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def like(q: str):
+    pattern = f"%{q}%"
+    with SessionLocal() as s:
+        return s.execute(
+            select(Listing.id).where((Listing.title.like(pattern)) | (Listing.description.like(pattern)))
+            .order_by(Listing.created_at.desc()).limit(20)
+        ).all()
+
+
+def main() -> None:
+    rnd = random.Random(42)
+    words, weights = vocabulary(rnd)
+    init_db()
+    with SessionLocal() as s:
+        have = s.scalar(select(func.count()).select_from(Listing))
+    if have < args.rows:
+        seed(args.rows - have, words, weights, rnd)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('optimize')"))
+
+    common, mid, rare = words[:50], words[500:1500], words[10_000:]
+    shapes = {
+        "common word": lambda: rnd.choice(common),
+        "mid-frequency word": lambda: rnd.choice(mid),
+        "rare word": lambda: rnd.choice(rare),
+        "two words (AND)": lambda: f"{rnd.choice(mid)} {rnd.choice(common)}",
+        "prefix (3 chars)": lambda: rnd.choice(mid)[:3] + "*",
+        "prefix + word": lambda: f"{rnd.choice(mid)} {rnd.choice(mid)[:4]}*",
+    }
+    print(f"{'query shape':<22} {'page 1 p50/p95 ms':>20} {'page 10 p50/p95 ms':>20}")
+    for name, make in shapes.items():
+        qs = [make() for _ in range(args.queries)]
+        p1 = timed(lambda q: search_listings(q), qs)
+        p10 = timed(lambda q: search_listings(q, page=10), qs)
+        print(f"{name:<22} {p1[0]:>9.2f} / {p1[1]:>7.2f} {p10[0]:>9.2f} / {p10[1]:>7.2f}")
+    # LIKE walks the date index until 20 rows match: quick for frequent words,
+    # a full table scan for rare ones.
+    for name, pool in (("LIKE mid-frequency", mid), ("LIKE rare word", rare)):
+        lk = timed(like, [rnd.choice(pool) for _ in range(args.like_queries)])
+        print(f"{name:<22} {lk[0]:>9.2f} / {lk[1]:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Mixed read/write throughput with and without SQLITE_PROFILE=production.
+
+    python -m benchmarks.bench_sqlite --threads 8 --seconds 5 --write-ratio 0.1
+
+Each profile runs in a fresh interpreter (the profile is chosen at import
+time) against its own seeded database file.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(args: argparse.Namespace) -> None:
+    from flask_books_xss.schema import init_db
+    from flask_books_xss.listings import create_listing, list_public_page
+
+    init_db()
+    for i in range(args.seed):
+        create_listing(user_id=None, title=f"seed {i}", price=i % 1000)
+
+    counts = {"reads": 0, "writes": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def worker(n: int) -> None:
+        rnd = random.Random(n)
+        reads = writes = 0
+        while time.perf_counter() < deadline:
+            if rnd.random() < args.write_ratio:
+                create_listing(user_id=None, title="bench", price=rnd.randint(0, 1000))
+                writes += 1
+            else:
+                list_public_page()
+                reads += 1
+        with lock:
+            counts["reads"] += reads
+            counts["writes"] += writes
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(json.dumps(counts))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--write-ratio", type=float, default=0.1)
+    ap.add_argument("--seed", type=int, default=2000, help="Listings inserted before timing.")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes")
+    for profile in ("default", "production"):
+        tmp = tempfile.mkdtemp(prefix="bench-sqlite-")
+        env = dict(os.environ, SQLITE_PROFILE=profile, DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                   PAGE_CACHE="off", PYTHONPATH=ROOT)
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite", "--child",
+             "--threads", str(args.threads), "--seconds", str(args.seconds),
+             "--write-ratio", str(args.write_ratio), "--seed", str(args.seed)],
+            env=env, cwd=tmp, check=True, capture_output=True, text=True,
+        )
+        counts = json.loads(out.stdout.strip().splitlines()[-1])
+        total = (counts["reads"] + counts["writes"]) / args.seconds
+        print(f"{profile:>11}: {total:8.1f} ops/s "
+              f"({counts['reads'] / args.seconds:.1f} reads/s, {counts['writes'] / args.seconds:.1f} writes/s)")
+
+
+if __name__ == "__main__":
+    main()
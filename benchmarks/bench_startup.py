@@ -0,0 +1,78 @@
+"""Cold start: import time and create_app() wall time, measured with -X importtime.
+
+    python -m benchmarks.bench_startup --runs 5 --top 15
+
+Every run is a fresh interpreter against a fresh database, so nothing is warm
+in sys.modules. Runs both with INIT_DB_ON_STARTUP=true (DDL at boot) and
+false (the production mode), and reports which heavy dependencies were
+pulled in before the first request.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ["requests", "qrcode", "PIL", "bleach", "html5lib", "argon2", "pyotp"]
+
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from flask_books_xss import create_app
+t1 = time.perf_counter()
+create_app()
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1e3, "create_app_ms": (t2 - t1) * 1e3,
+                  "loaded": sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY,)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)")
+
+
+def run_once(init_db: bool) -> Dict:
+    tmp = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ, PYTHONPATH=ROOT, DATABASE_URL=f"sqlite:///{tmp}/app.db",
+               INIT_DB_ON_STARTUP="true" if init_db else "false")
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _CHILD],
+                          cwd=tmp, env=env, capture_output=True, text=True, check=True)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    # Self time summed per top-level package, so nested imports aren't double counted.
+    self_us: Dict[str, int] = {}
+    for m in _LINE.finditer(proc.stderr):
+        name = m.group(2).split(".")[0]
+        self_us[name] = self_us.get(name, 0) + int(m.group(1))
+    result["self_us"] = self_us
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="Packages with the most import time to list.")
+    args = ap.parse_args()
+
+    for init_db in (True, False):
+        runs: List[Dict] = [run_once(init_db) for _ in range(args.runs)]
+        imp = statistics.median(r["import_ms"] for r in runs)
+        boot = statistics.median(r["create_app_ms"] for r in runs)
+        print(f"INIT_DB_ON_STARTUP={str(init_db).lower():<5}  import {imp:7.1f} ms  "
+              f"create_app {boot:6.1f} ms  total {imp + boot:7.1f} ms")
+        print(f"  heavy modules loaded at boot: {', '.join(runs[-1]['loaded']) or 'none'}")
+
+    totals: Dict[str, List[int]] = {}
+    for r in runs:
+        for name, us in r["self_us"].items():
+            totals.setdefault(name, []).append(us)
+    print(f"import time by package, production mode (median of {args.runs}):")
+    for name, us in sorted(totals.items(), key=lambda kv: -statistics.median(kv[1]))[:args.top]:
+        print(f"  {statistics.median(us) / 1e3:7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
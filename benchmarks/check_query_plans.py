@@ -0,0 +1,124 @@
+"""EXPLAIN QUERY PLAN for every listing filter/sort combination.
+
+    python -m benchmarks.check_query_plans [--rows 20000] [-v]
+
+Seeds a database through the migrations (so the real indexes exist), runs
+ANALYZE, then builds each page query listings.page_query() can produce: every
+sort, with and without a cursor in each direction, under every subset of the
+owner / price range / date range filters. Each plan must read `listing`
+through an index (never a bare table scan). It must not sort in a temp
+b-tree either, except when the filter ranges over a different column than
+the sort (e.g. a date range ordered by price): no b-tree index serves both,
+so the plan must instead range-scan the filter's index and sort only that
+slice. Those are listed as "sorted". Exits non-zero if any combination fails.
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+from datetime import timedelta
+
+_tmp = tempfile.mkdtemp(prefix="check-plans-")
+os.chdir(_tmp)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/plans.db")
+os.environ.setdefault("PAGE_CACHE", "off")
+
+from sqlalchemy import insert, text  # noqa: E402
+from flask_books_xss.db import engine  # noqa: E402
+from flask_books_xss.listings import SORTS, encode_cursor, page_query  # noqa: E402
+from flask_books_xss.models.listing import Listing  # noqa: E402
+from flask_books_xss.models.user import User  # noqa: E402
+from flask_books_xss.schema import init_db  # noqa: E402
+from flask_books_xss.utils.time import utc_now  # noqa: E402
+
+USERS = 200
+NOW = utc_now()
+FILTERS = {
+    "user_id": {"user_id": 7},
+    "price": {"min_price": 1_000, "max_price": 5_000},
+    "created": {"created_after": NOW - timedelta(days=30), "created_before": NOW - timedelta(days=1)},
+}
+
+
+def seed(n: int) -> None:
+    rnd = random.Random(3)
+    with engine.begin() as conn:
+        conn.execute(insert(User.__table__), [
+            {"email": f"u{i}@example.com", "password_hash": "x", "created_at": NOW} for i in range(1, USERS + 1)
+        ])
+        conn.execute(insert(Listing.__table__), [{
+            "user_id": rnd.randint(1, USERS),
+            "title": f"book {i}",
+            "price": rnd.randint(0, 100_000),
+            "created_at": NOW - timedelta(minutes=rnd.randint(0, 525_600)),
+        } for i in range(n)])
+        conn.execute(text("ANALYZE"))
+
+
+def explain(stmt):
+    compiled = stmt.compile(dialect=engine.dialect)  # sqlite: positional "?" parameters
+    params = tuple(compiled.params[k] for k in compiled.positiontup)
+    with engine.connect() as conn:
+        return [r[-1] for r in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)]
+
+
+def _sort_column(sort: str) -> str:
+    return SORTS[sort][0].key
+
+
+def problems(plan, sort: str, filtered: set) -> list:
+    found = []
+    for step in plan:
+        if step.startswith(("SCAN listing", "SEARCH listing")) and "INDEX" not in step:
+            found.append(f"no index: {step}")
+        if "TEMP B-TREE" in step:
+            # Only acceptable as a bounded sort: a range on another column, read through its index.
+            other = filtered - {_sort_column(sort), "user_id"}
+            if not any(s.startswith("SEARCH listing") and any(f"{col}>" in s or f"{col}<" in s for col in other)
+                       for s in plan):
+                found.append(f"sorts: {step}")
+    if not any("listing" in step for step in plan):
+        found.append("listing not read")
+    return found
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=20_000)
+    ap.add_argument("-v", "--verbose", action="store_true", help="Print every plan.")
+    args = ap.parse_args()
+
+    init_db()
+    seed(args.rows)
+
+    cursors = {"newest": encode_cursor(NOW, 10_000), "oldest": encode_cursor(NOW, 10_000),
+               "price_asc": encode_cursor(50_000, 10_000), "price_desc": encode_cursor(50_000, 10_000)}
+    failed = checked = sorted_ = 0
+    for sort in SORTS:
+        for r in range(len(FILTERS) + 1):
+            for names in itertools.combinations(FILTERS, r):
+                filters = {k: v for name in names for k, v in FILTERS[name].items()}
+                for direction in (None, "after", "before"):
+                    cursor = {direction: cursors[sort]} if direction else {}
+                    plan = explain(page_query(sort=sort, **cursor, **filters))
+                    filtered = {Listing.created_at.key if n == "created" else n for n in names}
+                    bad = problems(plan, sort, filtered)
+                    checked += 1
+                    label = f"{sort:<10} {'+'.join(names) or '-':<22} {direction or '-':<6}"
+                    if bad:
+                        failed += 1
+                        print(f"FAIL {label} {'; '.join(bad)}")
+                        continue
+                    sorts = any("TEMP B-TREE" in step for step in plan)
+                    sorted_ += sorts
+                    if args.verbose:
+                        print(f"{'sorted' if sorts else 'ok':<6} {label} {' / '.join(plan)}")
+    print(f"{checked - failed}/{checked} plans ok ({sorted_} range-scan a filter index and sort the slice)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Local stand-in for GitHub's OAuth endpoints.
+
+Authorization codes look like ``u<N>``; the token for ``u<N>`` identifies
+GitHub user ``N``, whose primary verified email is ``gh<N>@example.test``.
+``delay`` adds latency to every response to mimic a remote provider.
+
+    with FakeOAuthProvider() as provider:
+        app.config["OAUTH2_PROVIDERS"]["github"].update(provider.config())
+"""
+from __future__ import annotations
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real provider
+    disable_nagle_algorithm = True
+    server: "_Server"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, status: int, payload) -> None:
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _user_number(self) -> Optional[str]:
+        auth = self.headers.get("Authorization", "")
+        if not auth.startswith("Bearer tok-u"):
+            return None
+        return auth[len("Bearer tok-u"):]
+
+    def do_POST(self) -> None:
+        self.server.count("token")
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode())
+        code = (form.get("code") or [""])[0]
+        if self.path != "/login/oauth/access_token" or not code.startswith("u"):
+            return self._send(401, {"error": "bad_verification_code"})
+        self._send(200, {"access_token": f"tok-{code}", "token_type": "bearer", "scope": "user:email"})
+
+    def do_GET(self) -> None:
+        n = self._user_number()
+        if n is None:
+            return self._send(401, {"message": "Bad credentials"})
+        if self.path == "/user":
+            self.server.count("user")
+            return self._send(200, {"id": int(n), "login": f"gh{n}", "email": None})
+        if self.path == "/user/emails":
+            self.server.count("emails")
+            return self._send(200, [{"email": f"gh{n}@example.test", "primary": True, "verified": True}])
+        self._send(404, {"message": "Not Found"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.delay = delay
+        self.hits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.hits[name] = self.hits.get(name, 0) + 1
+
+
+class FakeOAuthProvider:
+    def __init__(self, delay: float = 0.0) -> None:
+        self._server = _Server(delay)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def hits(self) -> Dict[str, int]:
+        return dict(self._server.hits)
+
+    def config(self) -> Dict:
+        """Overrides for app.config['OAUTH2_PROVIDERS']['github']."""
+        return {
+            "client_id": "bench-client",
+            "client_secret": "bench-secret",
+            "authorize_url": f"{self.base_url}/login/oauth/authorize",
+            "token_url": f"{self.base_url}/login/oauth/access_token",
+            "userinfo": {
+                "url": f"{self.base_url}/user",
+                "emails_url": f"{self.base_url}/user/emails",
+                "id": lambda json: str(json["id"]),
+                "login": lambda json: json["login"],
+            },
+        }
+
+    def start(self) -> "FakeOAuthProvider":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOAuthProvider":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,399 @@
+"""In-process benchmark of every blueprint's hot path.
+
+    python -m benchmarks.harness --users 500 --listings 20000 --requests 200
+    python -m benchmarks.harness --endpoints web.index,auth.login --concurrency 4
+
+Seeds a throwaway SQLite database (users, listings, MFA secrets), drives the
+app through Flask's test client and reports p50/p95/p99 latency, throughput
+and how much RSS each endpoint's run added (at its peak and at the end).
+A scenario's first failure is printed with its traceback, and any failed
+request makes the run exit non-zero. Results are written as JSON to --baseline
+(default benchmarks/baselines/latest.json); if that file already exists the
+new run is diffed against it first. GitHub OAuth is served by the local
+stub in benchmarks/fake_oauth.py.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+HERE = Path(__file__).resolve().parent
+BASE_URL = "https://localhost"
+PASSWORD = "bench-password"
+
+
+def _configure_env(args: argparse.Namespace) -> None:
+    """Must run before anything imports flask_books_xss (config is read at import)."""
+    tmp = tempfile.mkdtemp(prefix="bench-harness-")
+    os.chdir(tmp)
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    if args.fast_hash:
+        os.environ.setdefault("ARGON2_MEMORY_COST", "1024")
+        os.environ.setdefault("ARGON2_TIME_COST", "1")
+    if args.no_page_cache:
+        os.environ["PAGE_CACHE"] = "off"
+    warnings.simplefilter("ignore")
+
+
+def _rss_kib() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return 0
+
+
+class _RssSampler(threading.Thread):
+    """Highest RSS seen while a scenario runs; ru_maxrss is a whole-process peak."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_kib()
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, _rss_kib())
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return max(self.peak, _rss_kib())
+
+
+class Context:
+    def __init__(self, app, users: List[int], mfa: Dict[int, str], provider) -> None:
+        self.app = app
+        self.users = users
+        self.mfa = mfa
+        self.mfa_users = sorted(mfa)
+        self.provider = provider
+        self.cursors: List[str] = []
+
+    def client(self, uid: int | None = None):
+        c = self.app.test_client()
+        if uid is not None:
+            with c.session_transaction(base_url=BASE_URL) as sess:
+                sess["uid"] = uid
+        return c
+
+    def new_mfa_user(self, email: str):
+        """A fresh user with a TOTP secret, for scenarios that spend a code."""
+        import pyotp
+        from sqlalchemy import insert
+        from flask_books_xss.db import SessionLocal
+        from flask_books_xss.models.mfa import UserMFA
+        from flask_books_xss.models.user import User
+
+        secret = pyotp.random_base32()
+        with SessionLocal() as s:
+            uid = s.execute(insert(User).values(email=email, failed_attempts=0).returning(User.id)).scalar_one()
+            s.execute(insert(UserMFA).values(user_id=uid, secret=secret))
+            s.commit()
+        return uid, secret
+
+    @staticmethod
+    def timed(client, method: str, url: str, expect: int | str = 200, **kwargs):
+        """Time one request and check it did what the scenario asked for.
+
+        `expect` is a status code, or the path a successful form post
+        redirects to. The app answers a failed post with a redirect too
+        (often to the same page) plus an "error" flash, so both are checked.
+        """
+        t0 = time.perf_counter()
+        resp = getattr(client, method)(url, base_url=BASE_URL, **kwargs)
+        elapsed = time.perf_counter() - t0
+        if isinstance(expect, int):
+            if resp.status_code != expect:
+                raise RuntimeError(f"HTTP {resp.status_code}, expected {expect}")
+            return elapsed, resp
+        if resp.status_code not in (302, 303) or urlparse(resp.location or "").path != expect:
+            raise RuntimeError(f"HTTP {resp.status_code} to {resp.location!r}, expected a redirect to {expect}")
+        with client.session_transaction(base_url=BASE_URL) as sess:
+            errors = [msg for category, msg in sess.get("_flashes", []) if category == "error"]
+        if errors:
+            raise RuntimeError(f"redirected to {expect} with error: {errors[0]}")
+        return elapsed, resp
+
+
+# ---- Scenarios: each performs any setup, then times exactly one request ----
+def index_anon(ctx: Context, i: int) -> float:
+    return ctx.timed(ctx.client(), "get", "/")[0]
+
+def index_user(ctx: Context, i: int) -> float:
+    return ctx.timed(ctx.client(ctx.users[i % len(ctx.users)]), "get", "/")[0]
+
+def index_page(ctx: Context, i: int) -> float:
+    cursor = ctx.cursors[i % len(ctx.cursors)]
+    return ctx.timed(ctx.client(), "get", f"/?after={cursor}")[0]
+
+def my_listings(ctx: Context, i: int) -> float:
+    return ctx.timed(ctx.client(ctx.users[i % len(ctx.users)]), "get", "/mine")[0]
+
+def list_book(ctx: Context, i: int) -> float:
+    data = {"title": f"Bench book {i}", "price": str(i % 1000),
+            "description": "<p>A <b>fine</b> copy, <i>barely</i> read. <a href='https://example.test'>more</a></p>" * 4}
+    return ctx.timed(ctx.client(ctx.users[i % len(ctx.users)]), "post", "/list", data=data, expect="/")[0]
+
+def register(ctx: Context, i: int) -> float:
+    data = {"email": f"new{i}-{random.random()}@bench.test", "password": PASSWORD}
+    return ctx.timed(ctx.client(), "post", "/auth/register", data=data, expect="/")[0]
+
+def login(ctx: Context, i: int) -> float:
+    data = {"email": f"user{ctx.users[i % len(ctx.users)]}@bench.test", "password": PASSWORD}
+    return ctx.timed(ctx.client(), "post", "/auth/login", data=data, expect="/")[0]
+
+def login_totp(ctx: Context, i: int) -> float:
+    data = {"email": f"user{ctx.mfa_users[i % len(ctx.mfa_users)]}@bench.test", "password": PASSWORD}
+    return ctx.timed(ctx.client(), "post", "/auth/login-totp", data=data, expect="/auth/verify")[0]
+
+def verify_totp(ctx: Context, i: int) -> float:
+    import pyotp
+    # A code is accepted once per user and timestep; a seeded user verifying
+    # twice within one step would be a rejected replay, so each request gets
+    # a user of its own.
+    uid, secret = ctx.new_mfa_user(f"totp{i}@bench.test")
+    c = ctx.client()
+    with c.session_transaction(base_url=BASE_URL) as sess:
+        sess["mfa_pending_uid"] = uid
+    return ctx.timed(c, "post", "/auth/verify", data={"code": pyotp.TOTP(secret).now()}, expect="/")[0]
+
+def mfa_qr(ctx: Context, i: int) -> float:
+    return ctx.timed(ctx.client(ctx.mfa_users[i % len(ctx.mfa_users)]), "get", "/auth/mfa/qr")[0]
+
+def oauth_callback(ctx: Context, i: int) -> float:
+    c = ctx.client()
+    resp = c.get("/oauth/authorize/github", base_url=BASE_URL)
+    state = parse_qs(urlparse(resp.location).query)["state"][0]
+    # Half the iterations log in an existing GitHub account, half create one.
+    gh_user = i // 2 if i % 2 else 10_000_000 + i
+    return ctx.timed(c, "get", f"/oauth/callback/github?code=u{gh_user}&state={state}", expect="/")[0]
+
+def api_listings(ctx: Context, i: int) -> float:
+    lo = (i * 37) % 900
+    return ctx.timed(ctx.client(), "get", f"/api/listings?min_price={lo}&max_price={lo + 100}")[0]
+
+def api_listings_sorted(ctx: Context, i: int) -> float:
+    sort = ("price_asc", "price_desc", "oldest")[i % 3]
+    return ctx.timed(ctx.client(), "get", f"/api/listings?user_id={ctx.users[i % len(ctx.users)]}&sort={sort}")[0]
+
+def api_listings_stats(ctx: Context, i: int) -> float:
+    url = "/api/listings/stats" if i % 2 else f"/api/listings/stats?user_id={ctx.users[i % len(ctx.users)]}"
+    return ctx.timed(ctx.client(), "get", url)[0]
+
+def api_listings_304(ctx: Context, i: int) -> float:
+    c, url = ctx.client(), f"/api/listings?after={ctx.cursors[i % len(ctx.cursors)]}"
+    etag = c.get(url, base_url=BASE_URL).headers.get("ETag", "")
+    return ctx.timed(c, "get", url, headers={"If-None-Match": etag}, expect=304)[0]
+
+def search(ctx: Context, i: int) -> float:
+    # Seed titles are "Seed book <n>": an exact title number, then a prefix.
+    q = f"book {i * 7919 % 1000}" if i % 2 else f"book {i % 100}*"
+    return ctx.timed(ctx.client(), "get", "/search", query_string={"q": q})[0]
+
+
+SCENARIOS: Dict[str, Callable[[Context, int], float]] = {
+    "web.index[anon]": index_anon,
+    "web.index[user]": index_user,
+    "web.index[page]": index_page,
+    "web.my_listings": my_listings,
+    "web.list_book": list_book,
+    "auth.register": register,
+    "auth.login": login,
+    "mfa.login_totp": login_totp,
+    "mfa.verify_totp": verify_totp,
+    "mfa.mfa_qr": mfa_qr,
+    "oauth2.oauth2_callback": oauth_callback,
+    "api.listings_page": api_listings,
+    "api.listings_page[sorted]": api_listings_sorted,
+    "api.listings_page[304]": api_listings_304,
+    "api.listings_stats": api_listings_stats,
+    "web.search": search,
+}
+
+
+def seed(n_users: int, n_listings: int, mfa_ratio: float):
+    import pyotp
+    from sqlalchemy import insert
+    from flask_books_xss.db import SessionLocal
+    from flask_books_xss.models.listing import Listing
+    from flask_books_xss.models.mfa import UserMFA
+    from flask_books_xss.models.user import User
+    from flask_books_xss.security import hash_password
+    from flask_books_xss.utils.time import utc_now
+
+    rnd = random.Random(42)
+    pw_hash = hash_password(PASSWORD)
+    now = utc_now()
+    with SessionLocal() as s:
+        s.execute(insert(User), [
+            {"id": i, "email": f"user{i}@bench.test", "password_hash": pw_hash, "failed_attempts": 0}
+            for i in range(1, n_users + 1)
+        ])
+        mfa = {uid: pyotp.random_base32() for uid in range(1, max(1, int(n_users * mfa_ratio)) + 1)}
+        s.execute(insert(UserMFA), [{"user_id": uid, "secret": secret} for uid, secret in mfa.items()])
+        for start in range(0, n_listings, 5000):
+            s.execute(insert(Listing), [
+                {"user_id": rnd.randint(1, n_users), "title": f"Seed book {n}", "price": rnd.randint(0, 100_000),
+                 "description": "<p>Seeded <b>listing</b></p>", "created_at": now - timedelta(seconds=n)}
+                for n in range(start, min(start + 5000, n_listings))
+            ])
+        s.commit()
+    return list(range(1, n_users + 1)), mfa
+
+
+def run_scenario(ctx: Context, fn, requests: int, concurrency: int) -> Dict:
+    rss_before = _rss_kib()
+    first_error: Optional[str] = None
+    lock = threading.Lock()
+
+    def one(i: int):
+        nonlocal first_error
+        try:
+            return fn(ctx, i)
+        except Exception:
+            with lock:
+                if first_error is None:
+                    first_error = f"request {i}: {traceback.format_exc()}"
+            return None
+
+    sampler = _RssSampler()
+    sampler.start()
+
+    t0 = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, range(requests)))
+    else:
+        samples = [one(i) for i in range(requests)]
+    wall = time.perf_counter() - t0
+    rss_peak = sampler.stop()
+
+    ok = sorted(s for s in samples if s is not None)
+    errors = requests - len(ok)
+    failure = {"first_error": first_error} if first_error else {}
+    if not ok:
+        return {"errors": errors, **failure}
+    q = statistics.quantiles(ok, n=100, method="inclusive") if len(ok) > 1 else [ok[0]] * 99
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(q[49] * 1000, 3),
+        "p95_ms": round(q[94] * 1000, 3),
+        "p99_ms": round(q[98] * 1000, 3),
+        "throughput_rps": round(len(ok) / wall, 1),
+        "rss_peak_delta_kib": rss_peak - rss_before,
+        "rss_delta_kib": _rss_kib() - rss_before,
+        **failure,
+    }
+
+
+def _fmt_change(new: float, old: float | None) -> str:
+    if not old:
+        return ""
+    pct = (new - old) / old * 100
+    return f" ({pct:+.0f}%)"
+
+
+def report(results: Dict, baseline: Dict | None) -> None:
+    prev = (baseline or {}).get("endpoints", {})
+    print(f"{'endpoint':<24} {'p50 ms':>14} {'p95 ms':>14} {'p99 ms':>14} {'req/s':>14} "
+          f"{'RSS +peak/end KiB':>18} {'err':>4}")
+    for name, r in results.items():
+        if "p50_ms" not in r:
+            print(f"{name:<24} {'all requests failed':>79} {r['errors']:>4}")
+            continue
+        old = prev.get(name, {})
+        cols = [f"{r[k]:.2f}{_fmt_change(r[k], old.get(k))}" for k in ("p50_ms", "p95_ms", "p99_ms")]
+        cols.append(f"{r['throughput_rps']:.1f}{_fmt_change(r['throughput_rps'], old.get('throughput_rps'))}")
+        rss = f"{r['rss_peak_delta_kib']}/{r['rss_delta_kib']}"
+        print(f"{name:<24} {cols[0]:>14} {cols[1]:>14} {cols[2]:>14} {cols[3]:>14} {rss:>18} {r['errors']:>4}")
+    for name, r in results.items():
+        if r.get("first_error"):
+            print(f"\n{name}: {r['errors']} failed, first was {r['first_error']}", file=sys.stderr)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--listings", type=int, default=10_000)
+    ap.add_argument("--mfa-ratio", type=float, default=0.5, help="Share of users with a TOTP secret.")
+    ap.add_argument("--requests", type=int, default=100, help="Requests per endpoint.")
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--endpoints", default="", help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    ap.add_argument("--fast-hash", action="store_true", help="Minimum Argon2 cost, to focus on everything else.")
+    ap.add_argument("--no-page-cache", action="store_true")
+    ap.add_argument("--oauth-delay-ms", type=float, default=0.0, help="Latency added by the fake provider.")
+    ap.add_argument("--baseline", type=Path, default=HERE / "baselines" / "latest.json")
+    ap.add_argument("--no-save", action="store_true", help="Compare against the baseline but don't overwrite it.")
+    args = ap.parse_args()
+
+    selected = [e.strip() for e in args.endpoints.split(",") if e.strip()] or list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        ap.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    # _configure_env moves into a temp dir; a relative --baseline means the caller's directory.
+    args.baseline = args.baseline.resolve()
+    _configure_env(args)
+    from benchmarks.fake_oauth import FakeOAuthProvider
+    from flask_books_xss import create_app
+    from flask_books_xss.listings import list_public_page
+    from flask_books_xss.utils.limiter import limiter
+
+    app = create_app()
+    limiter.enabled = False
+    users, mfa = seed(args.users, args.listings, args.mfa_ratio)
+
+    with FakeOAuthProvider(delay=args.oauth_delay_ms / 1000) as provider:
+        app.config["OAUTH2_PROVIDERS"]["github"].update(provider.config())
+        ctx = Context(app, users, mfa, provider)
+        page = list_public_page()
+        while page["next_cursor"] and len(ctx.cursors) < 10:
+            ctx.cursors.append(page["next_cursor"])
+            page = list_public_page(after=page["next_cursor"])
+        ctx.cursors = ctx.cursors or [""]
+
+        results = {}
+        for name in selected:
+            results[name] = run_scenario(ctx, SCENARIOS[name], args.requests, args.concurrency)
+            print(f"  ran {name}", file=sys.stderr)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    report(results, baseline)
+
+    if not args.no_save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({
+            "meta": {
+                "users": args.users, "listings": args.listings, "mfa_ratio": args.mfa_ratio,
+                "requests": args.requests, "concurrency": args.concurrency,
+                "fast_hash": args.fast_hash, "page_cache": not args.no_page_cache,
+                "python": platform.python_version(), "machine": platform.machine(),
+                "cpus": os.cpu_count(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "endpoints": results,
+        }, indent=2))
+        print(f"\nSaved to {args.baseline}")
+    if any(r["errors"] for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
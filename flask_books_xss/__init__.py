@@ -1,14 +1,20 @@
-from flask import Flask, g
+from flask import Flask, g, Response
 from os import getenv
 import os
 from .db import SessionLocal
-from .schema import init_db
+from .schema import init_db, db_cli, pending_migrations
 from .routes import web
 from .auth import bp as auth_bp
 from flask_talisman import Talisman
 from .utils.limiter import limiter
 from .oauth import bp as oauth2_bp
 from .mfa import mfa_bp
+from .api import api_bp
+from .security import HashingBusy, HASH_RETRY_AFTER, hashing_cli
+from . import assets, instrumentation
+from .listings import listings_cli
+from .search import search_cli
+from .aggregates import aggregates_cli
 talisman = Talisman()
 
 
@@ -22,7 +28,8 @@ CSP = {
 }
 
 def create_app():
-    app = Flask(__name__)
+    # static/ is served by assets.py under content-hashed URLs.
+    app = Flask(__name__, static_folder=None)
     app.config['SECRET_KEY'] = getenv("SECRET_KEY", "dev")
     app.config['VULNERABLE_MODE'] = getenv("VULNERABLE_MODE", "false").lower() == "true"
     
@@ -31,14 +38,24 @@ def create_app():
     if not app.config["VULNERABLE_MODE"]:
         talisman.init_app(
             app,
+            # No inline <script>/<style> or style="" anywhere, so the policy
+            # needs no per-response nonce and responses stay byte-identical.
             content_security_policy=CSP,
-            content_security_policy_nonce_in=["script-src", "style-src"],
             force_https=False,
             session_cookie_secure=True      # <--- turn off in local dev.
         )
-    init_db()
-
+    # Off in production: workers then boot without issuing DDL and
+    # `flask db upgrade` is run once per deploy instead.
+    if getenv("INIT_DB_ON_STARTUP", "true").lower() == "true":
+        init_db()
+    else:
+        behind = pending_migrations()
+        if behind:
+            app.logger.warning("database schema is behind: %d pending migration(s), run `flask db upgrade`",
+                               len(behind))
     
+    instrumentation.init_app(app)
+
     #app config for github auth
     app.config['OAUTH2_PROVIDERS'] = {
         'github': {
@@ -60,8 +77,20 @@ def create_app():
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(oauth2_bp, url_prefix='/oauth') 
     app.register_blueprint(mfa_bp, url_prefix='/auth')
+    app.register_blueprint(api_bp)
+    assets.init_app(app)
+    app.cli.add_command(hashing_cli)
+    app.cli.add_command(listings_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(search_cli)
+    app.cli.add_command(aggregates_cli)
 
     
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(e):
+        return Response("Too many login attempts in progress, please retry shortly.",
+                        status=503, headers={"Retry-After": str(HASH_RETRY_AFTER)})
+
     @app.teardown_appcontext
     def remove_session(exception=None):
         SessionLocal.remove()
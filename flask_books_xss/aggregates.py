@@ -0,0 +1,171 @@
+# aggregates.py
+"""Per-user listing stats and the marketplace price histogram, without scans.
+
+`listing_user_stats` (count, sum/min/max price per owner) and
+`listing_price_histogram` (count and price sum per price bucket) are kept
+up to date by triggers on `listing` (migration 6). The triggers run in the
+writing statement's transaction, so the create, update and delete helpers,
+bulk import and cascading user deletes all update the aggregates in the
+same commit as the rows. Reads are one primary-key lookup per user; the
+global figures come from at most PRICE_BUCKETS + 1 histogram rows plus two
+index lookups for min/max.
+
+    flask aggregates rebuild   # recompute both tables from `listing`
+    flask aggregates check     # compare them with a fresh scan; exit 1 on drift
+
+On backends without the triggers (anything but SQLite) the same numbers are
+computed from `listing` on each read.
+
+`listing_data_version` is a one-row counter the triggers of migration 9 bump
+on every listing write; data_version() reads it for the API's ETags.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.engine import Connection
+
+from .db import ReadSession, engine
+from .models.aggregates import ListingDataVersion, ListingPriceBucket, ListingUserStats
+from .models.listing import Listing
+
+PRICE_BUCKET_WIDTH = 1000   # must match the triggers in migration 6
+PRICE_BUCKETS = 100         # bucket PRICE_BUCKETS holds every price >= PRICE_BUCKETS * width
+
+MAINTAINED = engine.dialect.name == "sqlite"
+
+
+# ---- Queries over `listing` (rebuild, check, and reads without triggers) ----
+def _user_totals():
+    return (
+        select(Listing.user_id, func.count().label("listing_count"), func.sum(Listing.price).label("price_sum"),
+               func.min(Listing.price).label("price_min"), func.max(Listing.price).label("price_max"))
+        .where(Listing.user_id.is_not(None))
+        .group_by(Listing.user_id)
+    )
+
+
+def _bucket_totals():
+    bucket = case(
+        (Listing.price < 0, 0),
+        (Listing.price >= PRICE_BUCKETS * PRICE_BUCKET_WIDTH, PRICE_BUCKETS),
+        else_=Listing.price // PRICE_BUCKET_WIDTH,
+    ).label("bucket")
+    return (
+        select(bucket, func.count().label("listing_count"), func.sum(Listing.price).label("price_sum"))
+        .group_by(bucket)
+    )
+
+
+def _stored_users():
+    u = ListingUserStats
+    return select(u.user_id, u.listing_count, u.price_sum, u.price_min, u.price_max)
+
+
+def _stored_buckets():
+    b = ListingPriceBucket
+    return select(b.bucket, b.listing_count, b.price_sum)
+
+
+# ---- Reads ----
+def user_stats(user_id: int) -> Dict:
+    """{"listing_count", "price_min", "price_max", "price_avg"} for one owner."""
+    if MAINTAINED:
+        stmt = _stored_users().where(ListingUserStats.user_id == user_id)
+    else:
+        stmt = _user_totals().where(Listing.user_id == user_id)
+    with ReadSession() as s:
+        row = s.execute(stmt).first()
+    if row is None:
+        return {"listing_count": 0, "price_min": None, "price_max": None, "price_avg": None}
+    return {
+        "listing_count": row.listing_count,
+        "price_min": row.price_min,
+        "price_max": row.price_max,
+        "price_avg": round(row.price_sum / row.listing_count, 2),
+    }
+
+
+def market_stats() -> Dict:
+    """Global count, min/max/avg price and the non-empty histogram buckets."""
+    stmt = _stored_buckets() if MAINTAINED else _bucket_totals()
+    with ReadSession() as s:
+        buckets = s.execute(stmt.order_by("bucket")).all()
+        # Two statements: SQLite only answers a lone min() or max() from the index.
+        price_min = s.scalar(select(func.min(Listing.price)))
+        price_max = s.scalar(select(func.max(Listing.price)))
+    count = sum(b.listing_count for b in buckets)
+    total = sum(b.price_sum for b in buckets)
+    return {
+        "listing_count": count,
+        "price_min": price_min,
+        "price_max": price_max,
+        "price_avg": round(total / count, 2) if count else None,
+        "histogram": [
+            {
+                "price_from": b.bucket * PRICE_BUCKET_WIDTH,
+                "price_to": None if b.bucket >= PRICE_BUCKETS else (b.bucket + 1) * PRICE_BUCKET_WIDTH,
+                "listing_count": b.listing_count,
+            }
+            for b in buckets
+        ],
+    }
+
+
+def data_version() -> Optional[int]:
+    """Changes with every committed listing write; None without the triggers."""
+    if not MAINTAINED:
+        return None
+    with ReadSession() as s:
+        return s.scalar(select(ListingDataVersion.version).where(ListingDataVersion.id == 1))
+
+
+# ---- Maintenance ----
+def rebuild(conn: Connection) -> None:
+    """Replace both tables with totals recomputed from `listing`."""
+    # The deletes take SQLite's write lock first, so no listing write lands
+    # between the scan and the insert.
+    conn.execute(delete(ListingUserStats))
+    conn.execute(delete(ListingPriceBucket))
+    conn.execute(insert(ListingUserStats).from_select(
+        ["user_id", "listing_count", "price_sum", "price_min", "price_max"], _user_totals()))
+    conn.execute(insert(ListingPriceBucket).from_select(
+        ["bucket", "listing_count", "price_sum"], _bucket_totals()))
+
+
+def check(conn: Connection) -> List[str]:
+    """Differences between the stored aggregates and a fresh scan; empty when consistent."""
+    problems: List[str] = []
+    for label, stored, fresh in (("user", _stored_users(), _user_totals()),
+                                 ("bucket", _stored_buckets(), _bucket_totals())):
+        have = {tuple(r)[0]: tuple(r)[1:] for r in conn.execute(stored)}
+        want = {tuple(r)[0]: tuple(r)[1:] for r in conn.execute(fresh)}
+        for key in sorted(have.keys() | want.keys()):
+            if have.get(key) != want.get(key):
+                problems.append(f"{label} {key}: stored {have.get(key)} != actual {want.get(key)}")
+    return problems
+
+
+# ---- CLI ----
+aggregates_cli = AppGroup("aggregates", help="Listing aggregate tables.")
+
+@aggregates_cli.command("rebuild")
+def rebuild_command() -> None:
+    """Recompute per-user stats and the price histogram from scratch."""
+    with engine.begin() as conn:
+        rebuild(conn)
+    click.echo("Listing aggregates rebuilt.")
+
+@aggregates_cli.command("check")
+@click.option("--limit", default=20, show_default=True, help="Differences to print.")
+def check_command(limit: int) -> None:
+    """Compare the aggregates with a full scan of `listing`."""
+    with engine.connect() as conn:
+        problems = check(conn)
+    for line in problems[:limit]:
+        click.echo(line)
+    if problems:
+        raise click.ClickException(f"{len(problems)} aggregate row(s) out of sync; run `flask aggregates rebuild`")
+    click.echo("Listing aggregates are consistent.")
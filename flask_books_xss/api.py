@@ -0,0 +1,193 @@
+# api.py
+"""Read-only JSON API for listings.
+
+    GET /api/listings                 one page, ?sort= order (?after= / ?before= cursors)
+    GET /api/listings/<id>            one listing, with description
+    GET /api/listings/export.jsonl    every matching listing, streamed as JSON Lines
+    GET /api/listings/search?q=       ranked full-text matches (?page=)
+    GET /api/listings/stats           price stats and histogram (?user_id= for one owner)
+
+All but search and stats accept user_id, min_price, max_price,
+created_after and created_before (ISO 8601) filters; sort is newest
+(default), oldest, price_asc or price_desc. Responses carry a weak ETag
+derived from the listing data version (aggregates.data_version(), one
+primary-key read that every worker agrees on), so a polling client's
+If-None-Match is answered with 304 before the real query runs.
+"""
+from __future__ import annotations
+import hashlib
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+
+from flask import Blueprint, Response, abort, jsonify, request
+from sqlalchemy import select
+
+from .aggregates import data_version, market_stats, user_stats
+from .db import ReadSession
+from .listings import DEFAULT_SORT, PAGE_SIZE, SORTS, iter_listings, jsonl_line, list_public_page
+from .models.listing import Listing
+from .page_cache import page_cache
+from .search import search_listings
+from .utils.time import as_utc
+
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+MAX_PAGE_SIZE = 100
+EXPORT_BATCH_SIZE = 1000
+
+
+@api_bp.errorhandler(400)
+@api_bp.errorhandler(404)
+def api_error(e):
+    return jsonify(error=e.description if isinstance(e.description, str) else e.name), e.code
+
+
+def _int_arg(name: str, lo: int = 0, hi: Optional[int] = None) -> Optional[int]:
+    raw = request.args.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        value = int(raw)
+    except ValueError:
+        abort(400, description=f"invalid_{name}")
+    if value < lo or (hi is not None and value > hi):
+        abort(400, description=f"invalid_{name}")
+    return value
+
+
+def _datetime_arg(name: str) -> Optional[datetime]:
+    raw = request.args.get(name)
+    if raw in (None, ""):
+        return None
+    try:
+        return as_utc(datetime.fromisoformat(raw)).astimezone(timezone.utc)
+    except ValueError:
+        abort(400, description=f"invalid_{name}")
+
+
+def _filters() -> Dict[str, Any]:
+    return {
+        "user_id": _int_arg("user_id", lo=1),
+        "min_price": _int_arg("min_price"),
+        "max_price": _int_arg("max_price"),
+        "created_after": _datetime_arg("created_after"),
+        "created_before": _datetime_arg("created_before"),
+    }
+
+
+def _etag() -> Optional[str]:
+    version = data_version()
+    if version is None:
+        return None
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return hashlib.sha256(f"{version}|{request.path}|{args}".encode()).hexdigest()[:24]
+
+
+def _conditional(etag: Optional[str]) -> Optional[Response]:
+    if etag and request.if_none_match.contains_weak(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag, weak=True)
+        return resp
+    return None
+
+
+def _finish(resp: Response, etag: Optional[str]) -> Response:
+    if etag:
+        resp.set_etag(etag, weak=True)
+        resp.headers["Cache-Control"] = "public, no-cache"
+    return resp
+
+
+@api_bp.get("/listings")
+def listings_page():
+    etag = _etag()
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    filters = _filters()
+    limit = _int_arg("limit", lo=1, hi=MAX_PAGE_SIZE) or PAGE_SIZE
+    sort = request.args.get("sort") or DEFAULT_SORT
+    if sort not in SORTS:
+        abort(400, description="invalid_sort")
+    after, before = request.args.get("after"), request.args.get("before")
+    cache_key = page_cache.key("api", request.query_string.decode())
+    body = page_cache.get(cache_key)
+    if body is None:
+        try:
+            page = list_public_page(after=after, before=before, limit=limit, sort=sort, **filters)
+        except ValueError:
+            abort(400, description="invalid_cursor")
+        body = json.dumps(page, separators=(",", ":"))
+        page_cache.set(cache_key, body)
+    return _finish(Response(body, mimetype="application/json"), etag)
+
+
+@api_bp.get("/listings/search")
+def listings_search():
+    etag = _etag()
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    page = _int_arg("page", lo=1) or 1
+    try:
+        results = search_listings(request.args.get("q", ""), page=page)
+    except ValueError as e:
+        abort(400, description=str(e))
+    return _finish(jsonify(results), etag)
+
+
+@api_bp.get("/listings/stats")
+def listings_stats():
+    etag = _etag()
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    user_id = _int_arg("user_id", lo=1)
+    stats = market_stats() if user_id is None else user_stats(user_id)
+    return _finish(jsonify(stats), etag)
+
+
+@api_bp.get("/listings/<int:listing_id>")
+def listing_detail(listing_id: int):
+    etag = _etag()
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    with ReadSession() as s:
+        row = s.execute(
+            select(Listing.id, Listing.user_id, Listing.title, Listing.description, Listing.price, Listing.created_at)
+            .where(Listing.id == listing_id)
+        ).first()
+    if row is None:
+        abort(404, description="listing_not_found")
+    item = row._asdict()
+    item["created_at"] = row.created_at.isoformat()
+    return _finish(jsonify(item), etag)
+
+
+@api_bp.get("/listings/export.jsonl")
+def listings_export():
+    etag = _etag()
+    not_modified = _conditional(etag)
+    if not_modified:
+        return not_modified
+
+    filters = _filters()
+
+    def generate() -> Iterator[str]:
+        # One chunk per keyset batch: few writes, and memory stays at one batch.
+        batch = []
+        for row in iter_listings(EXPORT_BATCH_SIZE, **filters):
+            batch.append(jsonl_line(row))
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                yield "".join(batch)
+                batch.clear()
+        if batch:
+            yield "".join(batch)
+
+    return _finish(Response(generate(), mimetype="application/x-ndjson"), etag)
@@ -0,0 +1,142 @@
+# assets.py
+"""Static assets under content-hashed URLs, and compressed, revalidatable pages.
+
+Files in static/ are read once at startup (in the gunicorn master when
+preloaded) and served from memory as /static/<stem>.<hash>.<ext> with a
+one-year immutable Cache-Control, alongside gzip and, when the Brotli
+package is installed, brotli variants built at the same time. Templates link
+them through asset_url('app.css'), so a changed file gets a new URL.
+
+Dynamic HTML and JSON responses are gzipped on the fly for clients that
+accept it. HTML also gets a weak ETag, so a revalidating browser or proxy
+receives a bodyless 304 when the page is unchanged.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, NamedTuple
+
+from flask import Blueprint, Flask, Response, abort, g, request, url_for
+
+STATIC_DIR = Path(__file__).parent / "static"
+ASSET_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))   # bytes; smaller bodies go out as-is
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+
+_COMPRESSIBLE = {"text/html", "text/css", "text/plain", "application/json", "application/javascript",
+                 "image/svg+xml"}
+
+assets_bp = Blueprint("assets", __name__)
+
+
+class Asset(NamedTuple):
+    url_name: str
+    mimetype: str
+    digest: str
+    bodies: Dict[str, bytes]   # content-coding -> body; always has "identity"
+
+
+_by_name: Dict[str, Asset] = {}
+_by_url_name: Dict[str, Asset] = {}
+
+
+def _encode(raw: bytes, mimetype: str) -> Dict[str, bytes]:
+    bodies = {"identity": raw}
+    if mimetype not in _COMPRESSIBLE:
+        return bodies
+    # Built once, so spend the CPU on the smallest output.
+    bodies["gzip"] = gzip.compress(raw, compresslevel=9, mtime=0)
+    try:
+        import brotli
+    except ImportError:
+        return bodies
+    bodies["br"] = brotli.compress(raw, quality=11)
+    return bodies
+
+
+def load_assets(directory: Path = STATIC_DIR) -> None:
+    _by_name.clear()
+    _by_url_name.clear()
+    if not directory.is_dir():
+        return
+    for path in sorted(p for p in directory.rglob("*") if p.is_file()):
+        name = path.relative_to(directory).as_posix()
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()[:12]
+        stem, dot, ext = name.rpartition(".")
+        url_name = f"{stem}.{digest}.{ext}" if dot else f"{name}.{digest}"
+        mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        asset = Asset(url_name, mimetype, digest, _encode(raw, mimetype))
+        _by_name[name] = asset
+        _by_url_name[url_name] = asset
+
+
+def asset_url(name: str) -> str:
+    """URL of static/<name> that changes whenever its content does."""
+    asset = _by_name.get(name)
+    if asset is None:
+        raise ValueError(f"unknown_asset: {name}")
+    return url_for("assets.static", filename=asset.url_name)
+
+
+def _negotiate(available: Dict[str, bytes]) -> str:
+    accepted = request.accept_encodings
+    for coding in ("br", "gzip"):
+        if coding in available and accepted[coding]:
+            return coding
+    return "identity"
+
+
+@assets_bp.get("/static/<path:filename>")
+def static(filename: str):
+    asset = _by_url_name.get(filename)
+    immutable = asset is not None
+    if asset is None:
+        # Unhashed names still work (old bookmarks, tools) but must revalidate.
+        asset = _by_name.get(filename)
+    if asset is None:
+        abort(404)
+    coding = _negotiate(asset.bodies)
+    resp = Response(asset.bodies[coding], mimetype=asset.mimetype)
+    if coding != "identity":
+        resp.headers["Content-Encoding"] = coding
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(f"{asset.digest}-{coding}")
+    if immutable:
+        resp.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+    else:
+        resp.headers["Cache-Control"] = "public, no-cache"
+    return resp.make_conditional(request)
+
+
+# ---- Dynamic responses ----
+def _finish_response(resp: Response) -> Response:
+    if resp.mimetype not in _COMPRESSIBLE or resp.direct_passthrough or resp.is_streamed:
+        return resp
+    if request.method in ("GET", "HEAD") and resp.status_code == 200 and resp.mimetype == "text/html":
+        # Pages vary per viewer (nav bar, flashes), so browsers may keep them but must revalidate.
+        if "Cache-Control" not in resp.headers:
+            resp.headers["Cache-Control"] = "private, no-cache" if g.get("user") else "no-cache"
+        if not resp.get_etag()[0]:
+            resp.add_etag(weak=True)
+        resp.make_conditional(request)
+    resp.vary.add("Accept-Encoding")
+    if (resp.status_code == 304 or "Content-Encoding" in resp.headers
+            or not request.accept_encodings["gzip"]):
+        return resp
+    body = resp.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return resp
+    resp.set_data(gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0))
+    resp.headers["Content-Encoding"] = "gzip"
+    return resp
+
+
+def init_app(app: Flask) -> None:
+    load_assets()
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_url)
+    app.after_request(_finish_response)
@@ -2,8 +2,9 @@
 from flask import Blueprint, request, redirect, url_for, flash, render_template, g, session, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select
-from .db import SessionLocal
+from .db import get_db
 from .models.user import User
+from .principals import load_principal
 from .security import hash_password, verify_password
 from .utils.limiter import limiter
 
@@ -11,16 +12,19 @@ bp = Blueprint('auth', __name__)
 
 @bp.before_app_request
 def load_user() -> None:
-    """Load user before each request.
+    """Load the session principal before each request.
+
+    Served from the principal cache; no DB session is opened unless a view asks
+    for one via get_db().
     """
-    g.db = SessionLocal()
     uid = session.get("uid")
-    g.user = g.db.get(User, uid) if uid else None
+    g.user = load_principal(uid) if uid else None
 
 @bp.teardown_app_request
 def close_db(exc=None):
-    if hasattr(g, "db"):
-        g.db.close()
+    db = g.pop("db", None)
+    if db is not None:
+        db.close()
 
 @bp.route('/register', methods=['GET', 'POST'])
 def register() -> Response:
@@ -41,11 +45,12 @@ def register() -> Response:
 
         pw_hash = hash_password(password)
         new_user = User(email=email, password_hash=pw_hash, failed_attempts=0)
+        db = get_db()
         try:
-            g.db.add(new_user)
-            g.db.commit()
+            db.add(new_user)
+            db.commit()
         except IntegrityError as e:
-            g.db.rollback()
+            db.rollback()
             print(e)
             flash("Email already registered.", "error")
             return redirect(url_for("auth.register"))
@@ -1,22 +1,76 @@
 from __future__ import annotations
 import os
 from pathlib import Path
+from flask import g
 from sqlalchemy import event, create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///instance/app.db")
+IS_SQLITE = DB_URL.startswith("sqlite")
+
+# Opt-in tuned profile for file-backed SQLite under several workers: WAL so
+# readers never block on the writer, relaxed fsync, and a read/write split.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024)))
+PRODUCTION_SQLITE = IS_SQLITE and SQLITE_PROFILE == "production" and ":memory:" not in DB_URL
 
 if DB_URL.startswith("sqlite:///"):
     Path("instance").mkdir(parents=True, exist_ok=True)
-    
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {},
-                       pool_pre_ping=True)
 
-if DB_URL.startswith("sqlite"):
+_connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+if PRODUCTION_SQLITE:
+    # A single pooled connection serializes writers in-process instead of
+    # having them fight over SQLite's lock with busy retries.
+    engine = create_engine(DB_URL, connect_args=_connect_args, pool_pre_ping=True,
+                           pool_size=1, max_overflow=0)
+    read_engine = create_engine(DB_URL, connect_args=_connect_args, pool_pre_ping=True)
+else:
+    engine = create_engine(DB_URL, connect_args=_connect_args, pool_pre_ping=True)
+    read_engine = engine
+
+
+def _sqlite_pragmas(dbapi_connection, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    if PRODUCTION_SQLITE:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+if IS_SQLITE:
     @event.listens_for(engine, "connect")
     def _set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
+        _sqlite_pragmas(dbapi_connection, read_only=False)
+
+    if read_engine is not engine:
+        @event.listens_for(read_engine, "connect")
+        def _set_sqlite_read_pragma(dbapi_connection, connection_record):
+            _sqlite_pragmas(dbapi_connection, read_only=True)
+
+def _after_fork() -> None:
+    # A preforking server (serve.py) creates the app, and so opens connections,
+    # in the parent. Children get fresh pools; close=False leaves the
+    # parent's sockets/file handles alone instead of closing them under it.
+    engine.dispose(close=False)
+    if read_engine is not engine:
+        read_engine.dispose(close=False)
+
+os.register_at_fork(after_in_child=_after_fork)
+
+SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False))
+# Read-only sessions for listing/principal queries; same engine unless PRODUCTION_SQLITE.
+ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine, expire_on_commit=False)
 
-SessionLocal = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False))
\ No newline at end of file
+def get_db():
+    """Request-scoped session, opened on first use rather than for every request."""
+    if "db" not in g:
+        g.db = SessionLocal()
+    return g.db
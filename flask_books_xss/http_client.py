@@ -0,0 +1,129 @@
+# http_client.py
+"""Shared outbound HTTP for OAuth providers.
+
+Each provider gets one pooled keep-alive session (so the TCP+TLS handshake
+is paid once per connection, not per call) and a circuit breaker. Calls made
+while handling one callback share a time budget, so a slow provider can hold
+a worker for at most OAUTH_BUDGET seconds.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+OAUTH_POOL_SIZE = int(os.getenv("OAUTH_POOL_SIZE", "10"))
+OAUTH_CONNECT_TIMEOUT = float(os.getenv("OAUTH_CONNECT_TIMEOUT", "3"))
+OAUTH_READ_TIMEOUT = float(os.getenv("OAUTH_READ_TIMEOUT", "5"))
+OAUTH_BUDGET = float(os.getenv("OAUTH_BUDGET", "8"))
+OAUTH_BREAKER_THRESHOLD = int(os.getenv("OAUTH_BREAKER_THRESHOLD", "5"))
+OAUTH_BREAKER_COOLDOWN = float(os.getenv("OAUTH_BREAKER_COOLDOWN", "30"))
+OAUTH_FETCH_THREADS = int(os.getenv("OAUTH_FETCH_THREADS", "8"))
+
+
+class ProviderUnavailable(Exception):
+    """Provider timed out, failed, or its circuit is open."""
+
+
+class ProviderClient:
+    def __init__(self, name: str) -> None:
+        # requests is imported with the first client, i.e. on the first OAuth
+        # callback, rather than at app import.
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.name = name
+        self._exceptions = requests.RequestException
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=OAUTH_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+    # ---- Circuit breaker ----
+    def _check_circuit(self) -> bool:
+        """Raise while the circuit is open; True if this call is the half-open probe."""
+        with self._lock:
+            if self._failures < OAUTH_BREAKER_THRESHOLD:
+                return False
+            if time.monotonic() < self._open_until:
+                raise ProviderUnavailable(f"{self.name}: circuit open")
+            # Half-open after the cooldown: one call goes through as a probe,
+            # the rest fail fast until it has reported back.
+            if self._probing:
+                raise ProviderUnavailable(f"{self.name}: circuit half-open")
+            self._probing = True
+            return True
+
+    def _record(self, ok: bool, probe: bool = False) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if ok:
+                self._failures = 0
+            else:
+                self._failures += 1
+                if self._failures >= OAUTH_BREAKER_THRESHOLD:
+                    self._open_until = time.monotonic() + OAUTH_BREAKER_COOLDOWN
+
+    def request(self, method: str, url: str, deadline: float, **kwargs) -> requests.Response:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ProviderUnavailable(f"{self.name}: time budget exhausted")
+        probe = self._check_circuit()
+        timeout = (min(OAUTH_CONNECT_TIMEOUT, remaining), min(OAUTH_READ_TIMEOUT, remaining))
+        ok = False
+        try:
+            resp = self.session.request(method, url, timeout=timeout, **kwargs)
+            ok = resp.status_code < 500
+        except self._exceptions as e:
+            raise ProviderUnavailable(f"{self.name}: {e.__class__.__name__}") from e
+        finally:
+            # Also on unexpected errors, so a probe never leaves the circuit stuck half-open.
+            self._record(ok, probe)
+        return resp
+
+    def get_async(self, url: str, deadline: float, **kwargs) -> "Future[requests.Response]":
+        """Start a GET on the shared fetch pool so several calls overlap."""
+        return _fetch_pool().submit(self.request, "GET", url, deadline, **kwargs)
+
+
+_clients: Dict[str, ProviderClient] = {}
+_clients_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _fetch_pool() -> ThreadPoolExecutor:
+    global _executor
+    with _clients_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(OAUTH_FETCH_THREADS, thread_name_prefix="oauth-fetch")
+        return _executor
+
+
+def provider_client(name: str) -> ProviderClient:
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            client = _clients[name] = ProviderClient(name)
+        return client
+
+
+def new_deadline() -> float:
+    return time.monotonic() + OAUTH_BUDGET
+
+
+def _after_fork() -> None:
+    # Pooled sockets and executor threads don't survive a fork.
+    global _executor, _clients_lock
+    _clients.clear()
+    _executor = None
+    _clients_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,205 @@
+# instrumentation.py
+"""Opt-in request profiling (INSTRUMENTATION=true).
+
+Breaks each request down into phases (SQL, template rendering, sanitizing,
+Argon2), counts queries per request to flag N+1 patterns, and serves the
+per-endpoint totals in Prometheus text format on /metrics. /metrics only
+exists when METRICS_TOKEN is set, and scrapers must send it as
+`Authorization: Bearer <token>`. Slow requests can optionally be captured
+with cProfile.
+"""
+from __future__ import annotations
+import cProfile
+import hmac
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator
+from flask import Flask, Response, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+INSTRUMENTATION = os.getenv("INSTRUMENTATION", "false").lower() == "true"
+# A request with more queries than this, or repeating one statement this often, is flagged.
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))       # 0 disables cProfile dumps
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "instance/profiles"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")                       # empty: no /metrics route
+
+log = logging.getLogger(__name__)
+
+_enabled = False
+_lock = threading.Lock()
+_requests: Dict[str, list] = defaultdict(lambda: [0, 0.0])            # endpoint -> [count, seconds]
+_phases: Dict[tuple, list] = defaultdict(lambda: [0, 0.0])            # (endpoint, phase) -> [count, seconds]
+_queries: Dict[str, list] = defaultdict(lambda: [0, 0])               # endpoint -> [total, max per request]
+_n_plus_one: Counter = Counter()
+
+
+@contextmanager
+def span(phase: str) -> Iterator[None]:
+    """Time a block as `phase` of the current request; free when disabled."""
+    if not _enabled or not has_request_context():
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_phase(phase, time.perf_counter() - t0)
+
+
+def _add_phase(phase: str, seconds: float) -> None:
+    spans = g.setdefault("_spans", defaultdict(lambda: [0, 0.0]))
+    spans[phase][0] += 1
+    spans[phase][1] += seconds
+
+
+# ---- SQLAlchemy ----
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+    if context is not None:
+        context._query_timed = True
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["_query_start"].pop()
+    if has_request_context():
+        _add_phase("sql", time.perf_counter() - started)
+        g.setdefault("_statements", Counter())[statement] += 1
+
+def _handle_error(ctx) -> None:
+    # A failed statement never reaches after_cursor_execute; drop its start
+    # time so the stack doesn't grow and later queries aren't mis-timed.
+    # Errors raised before the cursor ran (compile, connect) pushed nothing.
+    if not getattr(ctx.execution_context, "_query_timed", False):
+        return
+    started = ctx.connection.info["_query_start"].pop()
+    if has_request_context():
+        _add_phase("sql", time.perf_counter() - started)
+        g.setdefault("_statements", Counter())[ctx.statement] += 1
+
+
+# ---- Jinja ----
+def _before_render(sender, template, context, **extra):
+    if has_request_context():
+        g.setdefault("_render_start", []).append(time.perf_counter())
+
+def _rendered(sender, template, context, **extra):
+    if has_request_context() and g.get("_render_start"):
+        _add_phase("render", time.perf_counter() - g._render_start.pop())
+
+
+# ---- Request lifecycle ----
+def _start_request() -> None:
+    g._request_start = time.perf_counter()
+    if PROFILE_SLOW_MS > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            g._profiler = profiler
+        except ValueError:
+            pass  # Another profiler is already active on this thread.
+
+def _finish_request(response: Response) -> Response:
+    started = g.pop("_request_start", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = request.endpoint or "<unmatched>"
+    statements: Counter = g.pop("_statements", Counter())
+    n_queries = sum(statements.values())
+
+    with _lock:
+        _requests[endpoint][0] += 1
+        _requests[endpoint][1] += elapsed
+        for phase, (count, seconds) in g.pop("_spans", {}).items():
+            _phases[(endpoint, phase)][0] += count
+            _phases[(endpoint, phase)][1] += seconds
+        _queries[endpoint][0] += n_queries
+        _queries[endpoint][1] = max(_queries[endpoint][1], n_queries)
+
+    repeated = statements.most_common(1)[0][1] if statements else 0
+    if n_queries > N_PLUS_ONE_THRESHOLD or repeated >= N_PLUS_ONE_THRESHOLD:
+        with _lock:
+            _n_plus_one[endpoint] += 1
+        log.warning("Possible N+1 in %s: %d queries, one statement repeated %d times",
+                    endpoint, n_queries, repeated)
+
+    profiler = g.pop("_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(PROFILE_DIR / f"{endpoint}-{int(time.time() * 1000)}.prof")
+    return response
+
+
+# ---- /metrics ----
+def _metrics_view() -> Response:
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not hmac.compare_digest(supplied.encode(), METRICS_TOKEN.encode()):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain",
+                        headers={"WWW-Authenticate": "Bearer"})
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+def render_metrics() -> str:
+    from .page_cache import page_cache
+    from .security import hash_pool
+
+    lines = [
+        "# TYPE app_request_seconds summary",
+    ]
+    with _lock:
+        for ep, (count, seconds) in sorted(_requests.items()):
+            lines.append(f'app_request_seconds_count{{endpoint="{_esc(ep)}"}} {count}')
+            lines.append(f'app_request_seconds_sum{{endpoint="{_esc(ep)}"}} {seconds:.6f}')
+        lines.append("# TYPE app_phase_seconds summary")
+        for (ep, phase), (count, seconds) in sorted(_phases.items()):
+            labels = f'endpoint="{_esc(ep)}",phase="{phase}"'
+            lines.append(f"app_phase_seconds_count{{{labels}}} {count}")
+            lines.append(f"app_phase_seconds_sum{{{labels}}} {seconds:.6f}")
+        lines.append("# TYPE app_sql_queries_total counter")
+        for ep, (total, _) in sorted(_queries.items()):
+            lines.append(f'app_sql_queries_total{{endpoint="{_esc(ep)}"}} {total}')
+        lines.append("# TYPE app_sql_queries_per_request_max gauge")
+        for ep, (_, most) in sorted(_queries.items()):
+            lines.append(f'app_sql_queries_per_request_max{{endpoint="{_esc(ep)}"}} {most}')
+        lines.append("# TYPE app_n_plus_one_suspects_total counter")
+        for ep, count in sorted(_n_plus_one.items()):
+            lines.append(f'app_n_plus_one_suspects_total{{endpoint="{_esc(ep)}"}} {count}')
+
+    lines.append("# TYPE app_page_cache_requests_total counter")
+    stats = page_cache.stats()
+    lines.append(f'app_page_cache_requests_total{{result="hit"}} {stats["hits"]}')
+    lines.append(f'app_page_cache_requests_total{{result="miss"}} {stats["misses"]}')
+    for name, value in hash_pool.metrics().items():
+        lines.append(f"app_hash_pool_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app: Flask) -> None:
+    """Wire up all hooks; does nothing unless INSTRUMENTATION=true."""
+    global _enabled
+    if not INSTRUMENTATION:
+        return
+    _enabled = True
+    from .db import engine, read_engine
+
+    for eng in {engine, read_engine}:
+        event.listen(eng, "before_cursor_execute", _before_cursor_execute)
+        event.listen(eng, "after_cursor_execute", _after_cursor_execute)
+        event.listen(eng, "handle_error", _handle_error)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if METRICS_TOKEN:
+        app.add_url_rule("/metrics", "metrics", _metrics_view)
@@ -1,10 +1,28 @@
 # listings.py
-from typing import List, Dict, Optional
-from sqlalchemy import select, desc
-from .db import SessionLocal
+import base64
+import csv
+import json
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import islice
+from typing import IO, Any, Iterable, Iterator, List, Dict, Optional, Tuple
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, desc, asc, or_, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from .db import SessionLocal, ReadSession
 from .models.listing import Listing
+from .page_cache import page_cache
+from .sanitizer import SANITIZER_VERSION, html_to_text, sanitize_html
+from .utils.time import as_utc, utc_now
 
-def create_listing(user_id: int, title: str, price: int, description: Optional[str] = None) -> Listing:
+PAGE_SIZE = 20
+
+def create_listing(user_id: int, title: str, price: int, description: Optional[str] = None,
+                   sanitizer_version: Optional[str] = None) -> Listing:
+    """Insert a listing. Pass `sanitizer_version` when title/description were
+    run through sanitizer.sanitize_html, so resanitize can skip the row."""
     if not isinstance(price, int):
         try:
             price = int(price)
@@ -12,48 +30,141 @@ def create_listing(user_id: int, title: str, price: int, description: Optional[s
             raise ValueError("price_must_be_int")
     title = title.strip()
     with SessionLocal() as s:
-        row = Listing(user_id=user_id, title=title, price=price, description=description)
+        row = Listing(user_id=user_id, title=title, price=price, description=description,
+                      sanitizer_version=sanitizer_version)
         s.add(row)
         s.commit()
         s.refresh(row)
-        return row
+    page_cache.invalidate()
+    return row
 
-def list_public() -> List[Dict]:
-    """All listings newest-first (no PII)."""
-    with SessionLocal() as s:
-        rows = s.execute(select(Listing).order_by(desc(Listing.created_at))).scalars().all()
-        return [
-            {
-                "id": r.id,
-                "title": r.title,
-                "price": r.price,
-                "created_at": r.created_at.isoformat(),
-                "user_id": r.user_id,
-            }
-            for r in rows
-        ]
-
-def list_mine(user_id: int) -> List[Dict]:
-    """Only current user's listings, newest-first."""
-    with SessionLocal() as s:
-        rows = (
-            s.execute(
-                select(Listing)
-                .where(Listing.user_id == user_id)
-                .order_by(desc(Listing.created_at))
-            )
-            .scalars()
-            .all()
-        )
-        return [
-            {
-                "id": r.id,
-                "title": r.title,
-                "price": r.price,
-                "created_at": r.created_at.isoformat(),
-            }
-            for r in rows
-        ]
+# ---- Keyset pagination ----
+# sort name -> (key column, descending). Every sort is keyed on (column, id) and
+# has a matching index, with or without an owner filter in front:
+#   created_at: ix_listing_created_id_desc, ix_listing_user_created_id
+#   price:      ix_listing_price_id,        ix_listing_user_price_id
+SORTS = {
+    "newest": (Listing.created_at, True),
+    "oldest": (Listing.created_at, False),
+    "price_desc": (Listing.price, True),
+    "price_asc": (Listing.price, False),
+}
+DEFAULT_SORT = "newest"
+
+def encode_cursor(key, listing_id: int) -> str:
+    """Opaque, URL-safe token for a (sort key, id) position."""
+    value = key.isoformat() if isinstance(key, datetime) else str(key)
+    raw = f"{value}|{listing_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, sort: str = DEFAULT_SORT) -> Tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        key_raw, id_raw = raw.rsplit("|", 1)
+        key = datetime.fromisoformat(key_raw) if SORTS[sort][0] is Listing.created_at else int(key_raw)
+        return key, int(id_raw)
+    except Exception:
+        raise ValueError("invalid_cursor")
+
+def listing_filters(*, user_id: Optional[int] = None, min_price: Optional[int] = None,
+                    max_price: Optional[int] = None, created_after: Optional[datetime] = None,
+                    created_before: Optional[datetime] = None) -> List:
+    """WHERE clauses shared by the paged and streaming readers."""
+    clauses = []
+    if user_id is not None:
+        clauses.append(Listing.user_id == user_id)
+    if min_price is not None:
+        clauses.append(Listing.price >= min_price)
+    if max_price is not None:
+        clauses.append(Listing.price <= max_price)
+    if created_after is not None:
+        clauses.append(Listing.created_at >= created_after)
+    if created_before is not None:
+        clauses.append(Listing.created_at < created_before)
+    return clauses
+
+def page_query(*, after: Optional[str] = None, before: Optional[str] = None, limit: int = PAGE_SIZE,
+               sort: str = DEFAULT_SORT, **filters):
+    """The SELECT behind list_public_page (exposed for query-plan checks)."""
+    if after and before:
+        raise ValueError("invalid_cursor")
+    if sort not in SORTS:
+        raise ValueError("invalid_sort")
+    column, descending = SORTS[sort]
+    going_back = before is not None
+    stmt = select(Listing.id, Listing.title, Listing.price, Listing.created_at, Listing.user_id)
+    stmt = stmt.where(*listing_filters(**filters))
+    if after or before:
+        c_key, c_id = decode_cursor(after or before, sort)
+        key, cursor = tuple_(column, Listing.id), tuple_(c_key, c_id)
+        # Forward runs in sort order; going back runs the other way and is flipped afterwards.
+        stmt = stmt.where(key < cursor if descending != going_back else key > cursor)
+    order = desc if descending != going_back else asc
+    return stmt.order_by(order(column), order(Listing.id)).limit(limit + 1)
+
+def list_public_page(*, after: Optional[str] = None, before: Optional[str] = None, limit: int = PAGE_SIZE,
+                     sort: str = DEFAULT_SORT, **filters) -> Dict:
+    """One page of listings in `sort` order (newest first by default), keyed on (sort key, id).
+
+    `after` continues forward, `before` goes back towards the first page.
+    Each page is a range scan on the sort's index; no OFFSET is used.
+    `filters` are passed to listing_filters().
+    """
+    stmt = page_query(after=after, before=before, limit=limit, sort=sort, **filters)
+    going_back = before is not None
+
+    with ReadSession() as s:
+        rows = s.execute(stmt).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if going_back:
+        rows.reverse()
+
+    items = [
+        {
+            "id": r.id,
+            "title": r.title,
+            "price": r.price,
+            "created_at": r.created_at.isoformat(),
+            "user_id": r.user_id,
+        }
+        for r in rows
+    ]
+    key_name = SORTS[sort][0].key
+    first, last = (rows[0], rows[-1]) if rows else (None, None)
+    # Moving forward we know there are earlier rows iff we started from a cursor;
+    # moving back, the page we came from is always still there.
+    has_prev = has_more if going_back else after is not None
+    has_next = True if going_back else has_more
+    return {
+        "items": items,
+        "next_cursor": encode_cursor(getattr(last, key_name), last.id) if last and has_next else None,
+        "prev_cursor": encode_cursor(getattr(first, key_name), first.id) if first and has_prev else None,
+    }
+
+def list_mine(user_id: int, sort: str = DEFAULT_SORT) -> List[Dict]:
+    """Only current user's listings, in `sort` order (newest first by default)."""
+    if sort not in SORTS:
+        raise ValueError("invalid_sort")
+    column, descending = SORTS[sort]
+    order = desc if descending else asc
+    with ReadSession() as s:
+        rows = s.execute(
+            select(Listing.id, Listing.title, Listing.price, Listing.created_at, Listing.description)
+            .where(Listing.user_id == user_id)
+            .order_by(order(column), order(Listing.id))
+        ).all()
+    return [
+        {
+            "id": r.id,
+            "title": r.title,
+            "price": r.price,
+            "created_at": r.created_at.isoformat(),
+            "description": r.description,
+        }
+        for r in rows
+    ]
 
 def delete_listing(user_id: int, listing_id: int) -> bool:
     """Hard delete (SQLite). Enforce ownership."""
@@ -63,18 +174,232 @@ def delete_listing(user_id: int, listing_id: int) -> bool:
             return False
         s.delete(row)
         s.commit()
-        return True
+    page_cache.invalidate()
+    return True
 
-def update_listing(user_id: int, listing_id: int, *, title: Optional[str] = None, price: Optional[int] = None, description: Optional[str] = None) -> bool:
+def update_listing(user_id: int, listing_id: int, *, title: Optional[str] = None, price: Optional[int] = None, description: Optional[str] = None,
+                   sanitizer_version: Optional[str] = None) -> bool:
     with SessionLocal() as s:
         row = s.get(Listing, listing_id)
         if not row or row.user_id != user_id:
             return False
         if title is not None:
             row.title = title.strip()
+            row.title_text = html_to_text(row.title)
         if price is not None:
             row.price = int(price)
         if description is not None:
             row.description = description
+            row.description_text = html_to_text(description)
+        if title is not None or description is not None:
+            row.sanitizer_version = sanitizer_version
         s.commit()
-        return True
+    page_cache.invalidate()
+    return True
+
+# ---- CLI ----
+listings_cli = AppGroup("listings", help="Listing maintenance.")
+
+@listings_cli.command("resanitize")
+@click.option("--batch-size", default=500, show_default=True)
+def resanitize(batch_size: int) -> None:
+    """Re-run the sanitizer on rows stamped with an older allow-list version."""
+    stale = or_(Listing.sanitizer_version.is_(None), Listing.sanitizer_version != SANITIZER_VERSION)
+    last_id, seen, changed = 0, 0, 0
+    while True:
+        with SessionLocal() as s:
+            rows = s.execute(
+                select(Listing.id, Listing.title, Listing.description)
+                .where(stale, Listing.id > last_id)
+                .order_by(Listing.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            for r in rows:
+                title = sanitize_html(r.title, max_len=120)
+                description = sanitize_html(r.description, max_len=2000) if r.description else r.description
+                changed += (title, description) != (r.title, r.description)
+                s.execute(
+                    update(Listing)
+                    .where(Listing.id == r.id)
+                    .values(title=title, description=description, sanitizer_version=SANITIZER_VERSION,
+                            title_text=html_to_text(title), description_text=html_to_text(description))
+                )
+            s.commit()
+        seen += len(rows)
+        last_id = rows[-1].id
+    if changed:
+        page_cache.invalidate()
+    click.echo(f"Re-sanitized {seen} rows ({changed} changed) to version {SANITIZER_VERSION}.")
+
+
+# ---- Bulk import/export ----
+# Every stage is a generator, so a file of any size is held one chunk at a time.
+IMPORT_CHUNK_SIZE = 1000
+EXPORT_FIELDS = ("id", "user_id", "title", "description", "price", "created_at")
+MAX_PRICE = 100_000
+
+def _read_records(fh: IO[str], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """(line_no, raw record) pairs; JSON lines are parsed by _parse_record."""
+    if fmt == "csv":
+        yield from enumerate(csv.DictReader(fh), start=1)
+        return
+    for line_no, line in enumerate(fh, start=1):
+        if line.strip():
+            yield line_no, line
+
+def _parse_record(raw: Any, fmt: str) -> Dict[str, Any]:
+    if fmt == "csv":
+        return raw
+    try:
+        rec = json.loads(raw)
+    except ValueError:
+        raise ValueError("invalid_json")
+    if not isinstance(rec, dict):
+        raise ValueError("not_an_object")
+    return rec
+
+def clean_record(rec: Dict[str, Any], user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Validate and sanitize one imported row the way routes.list_book does."""
+    title = sanitize_html(str(rec.get("title") or ""), max_len=120)
+    if not title:
+        raise ValueError("title_required")
+    description = sanitize_html(str(rec.get("description") or ""), max_len=2000) or None
+    try:
+        price = int(rec.get("price"))
+    except (TypeError, ValueError):
+        raise ValueError("price_must_be_int")
+    if price < 0 or price > MAX_PRICE:
+        raise ValueError("price_out_of_range")
+    owner = user_id if user_id is not None else rec.get("user_id")
+    created = rec.get("created_at")
+    return {
+        "user_id": int(owner) if owner not in (None, "") else None,
+        "title": title,
+        "description": description,
+        "price": price,
+        "sanitizer_version": SANITIZER_VERSION,
+        "created_at": as_utc(datetime.fromisoformat(created)).astimezone(timezone.utc) if created else utc_now(),
+    }
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    it = iter(items)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def import_listings(fh: IO[str], fmt: str, *, chunk_size: int = IMPORT_CHUNK_SIZE,
+                    user_id: Optional[int] = None, on_error=None) -> Tuple[int, int]:
+    """Stream records from `fh` into `listing`, one executemany + commit per chunk.
+
+    Rows that fail to parse or validate are skipped and reported through
+    `on_error(line_no, code)`. Returns (inserted, skipped).
+    """
+    skipped = 0
+
+    def cleaned() -> Iterator[Dict[str, Any]]:
+        nonlocal skipped
+        for line_no, raw in _read_records(fh, fmt):
+            try:
+                yield clean_record(_parse_record(raw, fmt), user_id)
+            except ValueError as e:
+                skipped += 1
+                if on_error:
+                    on_error(line_no, str(e))
+
+    inserted = 0
+    try:
+        for chunk in _chunks(cleaned(), chunk_size):
+            with SessionLocal() as s:
+                try:
+                    # Core insert with a list of dicts: one cursor.executemany(), no ORM objects.
+                    s.connection().execute(insert(Listing.__table__), chunk)
+                    s.commit()
+                except IntegrityError:
+                    # Only the foreign key can fail; the whole chunk is rolled back.
+                    raise ValueError(f"unknown_user_id in the chunk after {inserted} imported rows")
+            inserted += len(chunk)
+    finally:
+        if inserted:
+            page_cache.invalidate()
+    return inserted, skipped
+
+def iter_listings(batch_size: int = IMPORT_CHUNK_SIZE, **filters) -> Iterator[Tuple]:
+    """Listings in id order, fetched in keyset batches of `batch_size`.
+
+    Each batch uses its own short-lived session, so a slow consumer never
+    holds a read transaction open.
+    """
+    cols = [getattr(Listing, f) for f in EXPORT_FIELDS]
+    where = listing_filters(**filters)
+    last_id = 0
+    while True:
+        with ReadSession() as s:
+            rows = s.execute(
+                select(*cols).where(Listing.id > last_id, *where).order_by(Listing.id).limit(batch_size)
+            ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+def _export_values(row: Tuple) -> List:
+    return [v.isoformat() if isinstance(v, datetime) else v for v in row]
+
+def jsonl_line(row: Tuple) -> str:
+    """One iter_listings() row as a JSON Lines record."""
+    return json.dumps(dict(zip(EXPORT_FIELDS, _export_values(row))), ensure_ascii=False) + "\n"
+
+def export_listings(fh: IO[str], fmt: str, *, batch_size: int = IMPORT_CHUNK_SIZE) -> int:
+    writer = csv.writer(fh) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+    n = 0
+    for row in iter_listings(batch_size):
+        if writer:
+            writer.writerow(_export_values(row))
+        else:
+            fh.write(jsonl_line(row))
+        n += 1
+    return n
+
+@contextmanager
+def _open(path: str, mode: str):
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+    else:
+        with open(path, mode, encoding="utf-8", newline="") as fh:
+            yield fh
+
+def _format_for(path: str, fmt: Optional[str]) -> str:
+    return fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+
+@listings_cli.command("import")
+@click.argument("path", type=click.Path(allow_dash=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Defaults to csv for *.csv, else jsonl.")
+@click.option("--chunk-size", default=IMPORT_CHUNK_SIZE, show_default=True)
+@click.option("--user-id", type=int, default=None, help="Owner for every row (overrides the file).")
+def import_command(path: str, fmt: Optional[str], chunk_size: int, user_id: Optional[int]) -> None:
+    """Bulk-insert listings from CSV or JSON Lines, sanitized like the web form."""
+    fmt = _format_for(path, fmt)
+    with _open(path, "r") as fh:
+        try:
+            inserted, skipped = import_listings(
+                fh, fmt, chunk_size=chunk_size, user_id=user_id,
+                on_error=lambda line_no, code: click.echo(f"row {line_no}: {code}", err=True),
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    click.echo(f"Imported {inserted} listings ({skipped} skipped).", err=True)
+
+@listings_cli.command("export")
+@click.argument("path", type=click.Path(allow_dash=True, dir_okay=False), default="-")
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), default=None,
+              help="Defaults to csv for *.csv, else jsonl.")
+@click.option("--batch-size", default=IMPORT_CHUNK_SIZE, show_default=True)
+def export_command(path: str, fmt: Optional[str], batch_size: int) -> None:
+    """Stream every listing to CSV or JSON Lines (stdout by default)."""
+    with _open(path, "w") as fh:
+        n = export_listings(fh, _format_for(path, fmt), batch_size=batch_size)
+    click.echo(f"Exported {n} listings.", err=True)
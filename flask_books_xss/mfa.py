@@ -1,62 +1,84 @@
 from __future__ import annotations
-import os, io
-from typing import Optional
+import os, io, hashlib, threading
+from collections import OrderedDict
+from typing import Tuple
 from flask import (
-    Blueprint, request, redirect, url_for, flash, render_template_string, session, send_file
+    Blueprint, request, redirect, url_for, flash, render_template_string, session, Response
 )
 
 mfa_bp = Blueprint("mfa", __name__, url_prefix="/auth")
 
-from .db import SessionLocal, engine
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from .db import SessionLocal
 from .utils.limiter import limiter  
-from .models.user import User  
-
-try:
-    from .users import authenticate
-    HAVE_AUTHENTICATE = True
-except Exception:
-    from .security import verify_password
-    HAVE_AUTHENTICATE = False
+from .users import authenticate
 
 REQUIRE_2FA = os.getenv("REQUIRE_2FA", "false").lower() == "true"
 
-from sqlalchemy import Column, Integer, String, ForeignKey
-from .models.base import Base
-
-class UserMFA(Base):
-    __tablename__ = "user_mfa"
-    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
-    secret  = Column(String(64), nullable=False, unique=True)
-
-UserMFA.__table__.create(bind=engine, checkfirst=True)
+from .models.mfa import UserMFA
+from .principals import invalidate_principal, load_mfa_state
+from .totp_replay import verify_once
 
 import pyotp
-import qrcode
 
 ISSUER = "IKT222-BookApp"  
 
-def _get_user_by_email(email: str) -> Optional[User]:
-    with SessionLocal() as s:
-        return s.query(User).filter(User.email == email).first()
-
-def _get_user_by_id(uid: int) -> Optional[User]:
-    with SessionLocal() as s:
-        return s.get(User, uid)
-
-def _get_secret(uid: int) -> Optional[str]:
-    with SessionLocal() as s:
-        row = s.get(UserMFA, uid)
-        return row.secret if row else None
+# ---- QR cache ----
+# Rendered QR codes per user, tagged with the secret they encode so a rotated
+# secret is never served stale. SVG skips Pillow's PNG encoder entirely.
+QR_FORMAT = os.getenv("QR_FORMAT", "png").lower()
+QR_CACHE_MAX = int(os.getenv("QR_CACHE_MAX", "1024"))
+_qr_cache: "OrderedDict[int, Tuple[str, str, bytes, str]]" = OrderedDict()  # uid -> (secret, etag, body, mimetype)
+_qr_lock = threading.Lock()
+
+def _qr_etag(uid: int, secret: str) -> str:
+    return hashlib.sha256(f"{uid}:{secret}:{QR_FORMAT}".encode()).hexdigest()[:32]
+
+def _render_qr(email: str, secret: str) -> Tuple[bytes, str]:
+    import qrcode  # deferred: qrcode and Pillow are only needed on a cache miss
+    uri = pyotp.TOTP(secret).provisioning_uri(name=email, issuer_name=ISSUER)
+    if QR_FORMAT == "svg":
+        from qrcode.image.svg import SvgPathImage
+        return qrcode.make(uri, image_factory=SvgPathImage).to_string(), "image/svg+xml"
+    img = qrcode.make(uri)
+    buf = io.BytesIO(); img.save(buf, format="PNG")
+    return buf.getvalue(), "image/png"
+
+def _cached_qr(uid: int, email: str, secret: str) -> Tuple[str, bytes, str]:
+    with _qr_lock:
+        hit = _qr_cache.get(uid)
+        if hit and hit[0] == secret:
+            _qr_cache.move_to_end(uid)
+            return hit[1], hit[2], hit[3]
+    body, mimetype = _render_qr(email, secret)
+    etag = _qr_etag(uid, secret)
+    with _qr_lock:
+        _qr_cache[uid] = (secret, etag, body, mimetype)
+        while len(_qr_cache) > QR_CACHE_MAX:
+            _qr_cache.popitem(last=False)
+    return etag, body, mimetype
+
+def _invalidate_qr(uid: int) -> None:
+    with _qr_lock:
+        _qr_cache.pop(uid, None)
 
 def _get_or_create_secret(uid: int) -> str:
-    with SessionLocal() as s:
-        row = s.get(UserMFA, uid)
-        if row and row.secret:
-            return row.secret
-        secret = pyotp.random_base32()
-        s.merge(UserMFA(user_id=uid, secret=secret))
-        s.commit()
+    _, secret = load_mfa_state(uid)
+    if secret:
         return secret
+    secret = pyotp.random_base32()
+    with SessionLocal() as s:
+        s.add(UserMFA(user_id=uid, secret=secret))
+        try:
+            s.commit()
+        except IntegrityError:
+            # Enabled concurrently (e.g. another tab); keep the stored secret.
+            s.rollback()
+            secret = s.get(UserMFA, uid).secret
+    invalidate_principal(uid)
+    _invalidate_qr(uid)
+    return secret
 
 @mfa_bp.get("/mfa/cancel")
 def mfa_cancel():
@@ -78,10 +100,10 @@ def mfa_enable():
         flash("2FA enabled. Scan the QR with your Authenticator app.", "ok")
         return redirect(url_for("mfa.mfa_enable"))
 
-    user = _get_user_by_id(uid)
-    secret = _get_secret(uid)
+    user, secret = load_mfa_state(uid)
     return render_template_string(
         """<!doctype html>
+        <link rel="stylesheet" href="{{ asset_url('app.css') }}">
         <h1>Two-Factor Authentication (TOTP)</h1>
         {% if secret %}
           <p>2FA is <strong>enabled</strong> for {{ user.email }}.</p>
@@ -98,7 +120,7 @@ def mfa_enable():
           <p>2FA is currently <strong>disabled</strong>.</p>
           <form method="post"><button type="submit">Enable 2FA</button></form>
         {% endif %}
-        <p style="margin-top:1rem">
+        <p class="spaced">
         <a href="{{ url_for('auth.login') }}">Back to Login</a>
         &nbsp;·&nbsp;
         <a href="{{ url_for('mfa.login_totp') }}">Login with 2FA</a>
@@ -114,16 +136,21 @@ def mfa_qr():
         flash("Log in first.", "error")
         return redirect(url_for("auth.login"))
 
-    user = _get_user_by_id(uid)
-    secret = _get_secret(uid)
+    user, secret = load_mfa_state(uid)
     if not user or not secret:
         flash("Enable 2FA first.", "error")
         return redirect(url_for("mfa.mfa_enable"))
 
-    uri = pyotp.TOTP(secret).provisioning_uri(name=user.email, issuer_name=ISSUER)
-    img = qrcode.make(uri)
-    buf = io.BytesIO(); img.save(buf, format="PNG"); buf.seek(0)
-    return send_file(buf, mimetype="image/png")
+    # The browser revalidates every time but gets a bodyless 304 while the secret is unchanged.
+    if request.if_none_match.contains(_qr_etag(uid, secret)):
+        resp = Response(status=304)
+    else:
+        _, body, mimetype = _cached_qr(uid, user.email, secret)
+        resp = Response(body, mimetype=mimetype)
+    resp.set_etag(_qr_etag(uid, secret))
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    return resp
 
 @mfa_bp.post("/mfa/confirm")
 @limiter.limit("5 per minute")
@@ -133,13 +160,13 @@ def mfa_confirm():
         flash("Log in first.", "error")
         return redirect(url_for("auth.login"))
 
-    secret = _get_secret(uid)
+    _, secret = load_mfa_state(uid)
     if not secret:
         flash("Enable 2FA first.", "error")
         return redirect(url_for("mfa.mfa_enable"))
 
     code = (request.form.get("code") or "").strip()
-    if pyotp.TOTP(secret).verify(code, valid_window=1):
+    if verify_once(uid, secret, code):
         flash("2FA setup confirmed.", "ok")
     else:
         flash("Invalid or expired code.", "error")
@@ -151,6 +178,7 @@ def login_totp():
     if request.method == "GET":
         return render_template_string(
             """<!doctype html>
+            <link rel="stylesheet" href="{{ asset_url('app.css') }}">
             <h1>Login (with 2FA)</h1>
             <form method="post">
               <label>Email <input name="email" type="email" required></label><br>
@@ -163,22 +191,14 @@ def login_totp():
     email = (request.form.get("email") or "").strip().lower()
     password = request.form.get("password") or ""
 
-    if HAVE_AUTHENTICATE:
-        user = authenticate(email, password)  
-        if not user:
-            flash("Invalid email or password.", "error")
-            return redirect(url_for("mfa.login_totp"))
-        u = _get_user_by_id(user.id)  
-    else:
-        u = _get_user_by_email(email)
-        if not u:
-            flash("Invalid email or password.", "error")
-            return redirect(url_for("mfa.login_totp"))
-        if not verify_password(u.password_hash, password):  
-            flash("Invalid email or password.", "error")
-            return redirect(url_for("mfa.login_totp"))
-
-    has_secret = bool(_get_secret(u.id))
+    # authenticate() primes the principal cache, so this lookup costs no query.
+    user = authenticate(email, password)
+    u = load_mfa_state(user.id)[0] if user else None
+    if not u:
+        flash("Invalid email or password.", "error")
+        return redirect(url_for("mfa.login_totp"))
+
+    has_secret = u.mfa_enabled
     if REQUIRE_2FA and not has_secret:
         session.clear(); session["uid"] = u.id
         flash("2FA required. Please enable first.", "error")
@@ -205,12 +225,13 @@ def verify_totp():
     if request.method == "GET":
         return render_template_string(
             """<!doctype html>
+            <link rel="stylesheet" href="{{ asset_url('app.css') }}">
             <h1>Enter 2FA code</h1>
             <form method="post">
               <input name="code" pattern="\\d{6}" inputmode="numeric" maxlength="6" placeholder="123456" required>
               <button>Verify</button>
             </form>
-            <p style="margin-top:1rem">
+            <p class="spaced">
             <a href="{{ url_for('mfa.mfa_cancel') }}">Cancel</a>
             &nbsp;·&nbsp;
             <a href="{{ url_for('mfa.mfa_enable') }}">2FA settings</a>
@@ -220,13 +241,13 @@ def verify_totp():
             """
         )
 
-    secret = _get_secret(pending_uid)
+    _, secret = load_mfa_state(pending_uid)
     if not secret:
         flash("2FA not enabled for this account.", "error")
         return redirect(url_for("mfa.login_totp"))
 
     code = (request.form.get("code") or "").strip()
-    ok = pyotp.TOTP(secret).verify(code, valid_window=1)
+    ok = verify_once(pending_uid, secret, code)
     if not ok:
         flash("Invalid or expired code.", "error")
         return redirect(url_for("mfa.verify_totp"))
@@ -247,8 +268,8 @@ def mfa_disable():
         return redirect(url_for("auth.login"))
 
     with SessionLocal() as s:
-        row = s.get(UserMFA, uid)
-        if row:
-            s.delete(row); s.commit()
+        s.execute(delete(UserMFA).where(UserMFA.user_id == uid)); s.commit()
+    invalidate_principal(uid)
+    _invalidate_qr(uid)
     flash("2FA disabled for your account.", "ok")
     return redirect(url_for("mfa.mfa_enable"))
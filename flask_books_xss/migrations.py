@@ -0,0 +1,330 @@
+# migrations.py
+"""Ordered, versioned schema migrations.
+
+Each migration is a function registered with @migration(version, description)
+and runs in its own transaction; the highest applied version is recorded in
+`schema_version`. Migrations must be idempotent: on SQLite, DDL issued through
+pysqlite is not transactional, and a database created by the old
+`create_all` already has some of the later objects, so each step checks
+before it creates.
+
+    flask db upgrade     # apply everything pending
+    flask db current     # show applied version and what is pending
+"""
+from __future__ import annotations
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+from .sanitizer import html_to_text
+from .utils.time import utc_now
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, default=utc_now),
+)
+
+
+def migration(version: int, description: str):
+    def register(fn: Callable[[Connection], None]):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError("migrations_out_of_order")
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return register
+
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"] == column for c in inspect(conn).get_columns(table))
+
+
+def _has_index(conn: Connection, table: str, index: str) -> bool:
+    return any(i["name"] == index for i in inspect(conn).get_indexes(table))
+
+
+# ---- Migrations ----
+@migration(1, "baseline: user, oauth_account, listing, user_mfa")
+def _baseline(conn: Connection) -> None:
+    from .models.base import Base
+    from .models import listing, mfa, user  # noqa: F401  (register tables)
+    tables = [Base.metadata.tables[n] for n in ("user", "oauth_account", "listing", "user_mfa")]
+    Base.metadata.create_all(conn, tables=tables)
+
+
+@migration(2, "listing (created_at DESC, id DESC) index for keyset pagination")
+def _listing_created_id(conn: Connection) -> None:
+    if not _has_index(conn, "listing", "ix_listing_created_id_desc"):
+        conn.execute(text("CREATE INDEX ix_listing_created_id_desc ON listing (created_at DESC, id DESC)"))
+
+
+@migration(3, "listing.sanitizer_version")
+def _listing_sanitizer_version(conn: Connection) -> None:
+    # Added as NULL, i.e. "never sanitized", so `flask listings resanitize` picks the rows up.
+    if not _has_column(conn, "listing", "sanitizer_version"):
+        conn.execute(text("ALTER TABLE listing ADD COLUMN sanitizer_version VARCHAR(16)"))
+
+
+@migration(4, "listing_fts full-text index with sync triggers")
+def _listing_fts(conn: Connection) -> None:
+    # FTS5 is SQLite-only; search is unavailable on other backends.
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS listing_fts USING fts5("
+        " title, description, content='listing', content_rowid='id',"
+        " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS listing_fts_ai AFTER INSERT ON listing BEGIN
+            INSERT INTO listing_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS listing_fts_ad AFTER DELETE ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER IF NOT EXISTS listing_fts_au AFTER UPDATE OF title, description ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO listing_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END"""))
+    # ORDER BY rank then uses bm25 with title hits weighted 10x description hits.
+    conn.execute(text("INSERT INTO listing_fts(listing_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"))
+    conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('rebuild')"))
+
+
+@migration(5, "listing (key, id) indexes for every filter/sort combination")
+def _listing_sort_indexes(conn: Connection) -> None:
+    for name, columns in (
+        ("ix_listing_price_id", "price, id"),
+        ("ix_listing_user_created_id", "user_id, created_at, id"),
+        ("ix_listing_user_price_id", "user_id, price, id"),
+    ):
+        if not _has_index(conn, "listing", name):
+            conn.execute(text(f"CREATE INDEX {name} ON listing ({columns})"))
+    # Both are prefixes of ix_listing_user_created_id.
+    conn.execute(text("DROP INDEX IF EXISTS ix_listing_user_created_desc"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_listing_user_id"))
+
+
+@migration(6, "listing_user_stats and listing_price_histogram aggregates with sync triggers")
+def _listing_aggregates(conn: Connection) -> None:
+    from .models.base import Base
+    from .models import aggregates  # noqa: F401  (register tables)
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables[n]
+                                           for n in ("listing_user_stats", "listing_price_histogram")])
+    # Triggers are SQLite-only, like the FTS index; aggregates.py computes the
+    # same numbers from `listing` on other backends.
+    if conn.dialect.name != "sqlite":
+        return
+    # Buckets are 1000 wide; bucket 100 holds every price from 100000 up
+    # (aggregates.PRICE_BUCKET_WIDTH / PRICE_BUCKETS).
+    add = """
+        INSERT INTO listing_user_stats (user_id, listing_count, price_sum, price_min, price_max)
+        SELECT new.user_id, 1, new.price, new.price, new.price WHERE new.user_id IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET
+            listing_count = listing_count + 1,
+            price_sum = price_sum + excluded.price_sum,
+            price_min = min(price_min, excluded.price_min),
+            price_max = max(price_max, excluded.price_max);
+        INSERT INTO listing_price_histogram (bucket, listing_count, price_sum)
+        VALUES (min(max(new.price, 0) / 1000, 100), 1, new.price)
+        ON CONFLICT (bucket) DO UPDATE SET
+            listing_count = listing_count + 1,
+            price_sum = price_sum + excluded.price_sum;"""
+    # min/max only need a lookup (on ix_listing_user_price_id) when the
+    # removed price was the extreme; the trigger runs after the row changed.
+    # coalesce() covers the user's last listing, whose row is deleted next.
+    remove = """
+        UPDATE listing_user_stats SET
+            listing_count = listing_count - 1,
+            price_sum = price_sum - old.price,
+            price_min = CASE WHEN old.price > price_min THEN price_min
+                             ELSE coalesce((SELECT min(price) FROM listing WHERE user_id = old.user_id), old.price) END,
+            price_max = CASE WHEN old.price < price_max THEN price_max
+                             ELSE coalesce((SELECT max(price) FROM listing WHERE user_id = old.user_id), old.price) END
+        WHERE user_id = old.user_id;
+        DELETE FROM listing_user_stats WHERE user_id = old.user_id AND listing_count <= 0;
+        UPDATE listing_price_histogram SET
+            listing_count = listing_count - 1,
+            price_sum = price_sum - old.price
+        WHERE bucket = min(max(old.price, 0) / 1000, 100);
+        DELETE FROM listing_price_histogram
+        WHERE bucket = min(max(old.price, 0) / 1000, 100) AND listing_count <= 0;"""
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS listing_agg_ai AFTER INSERT ON listing BEGIN {add} END"))
+    conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS listing_agg_ad AFTER DELETE ON listing BEGIN {remove} END"))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS listing_agg_au AFTER UPDATE OF price, user_id ON listing BEGIN {remove} {add} END"
+    ))
+    from .aggregates import rebuild
+    rebuild(conn)
+
+
+@migration(7, "listing_fts indexes text with the markup stripped")
+def _listing_fts_plain_text(conn: Connection) -> None:
+    # Migration 4 indexed the stored HTML, so tag names, attribute values and
+    # entity names ("href", "https", "amp") matched. strip_html() is
+    # sanitizer.html_to_text; the view gives 'rebuild' the same stripped text
+    # the triggers index. Only this connection defines it: migration 8
+    # replaces the function with plain-text columns any client can maintain.
+    if conn.dialect.name != "sqlite":
+        return
+    conn.connection.driver_connection.create_function("strip_html", 1, html_to_text, deterministic=True)
+    for trigger in ("listing_fts_ai", "listing_fts_ad", "listing_fts_au"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    conn.execute(text("DROP TABLE IF EXISTS listing_fts"))
+    conn.execute(text(
+        "CREATE VIEW IF NOT EXISTS listing_fts_source AS"
+        " SELECT id, strip_html(title) AS title, strip_html(description) AS description FROM listing"
+    ))
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE listing_fts USING fts5("
+        " title, description, content='listing_fts_source', content_rowid='id',"
+        " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_ai AFTER INSERT ON listing BEGIN
+            INSERT INTO listing_fts(rowid, title, description)
+            VALUES (new.id, strip_html(new.title), strip_html(new.description));
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_ad AFTER DELETE ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, strip_html(old.title), strip_html(old.description));
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_au AFTER UPDATE OF title, description ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, strip_html(old.title), strip_html(old.description));
+            INSERT INTO listing_fts(rowid, title, description)
+            VALUES (new.id, strip_html(new.title), strip_html(new.description));
+        END"""))
+    conn.execute(text("INSERT INTO listing_fts(listing_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"))
+    conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('rebuild')"))
+
+
+@migration(8, "listing.title_text/description_text feed listing_fts; no app-defined SQL functions")
+def _listing_fts_text_columns(conn: Connection) -> None:
+    # Migration 7's triggers called strip_html(), which only the app defined,
+    # so any other client (sqlite3 CLI, backup scripts) failed to write
+    # `listing`. The stripped text is now stored by Python on write (see
+    # models.listing) and the triggers only copy columns.
+    for column in ("title_text", "description_text"):
+        if not _has_column(conn, "listing", column):
+            conn.execute(text(f"ALTER TABLE listing ADD COLUMN {column} TEXT"))
+    if conn.dialect.name == "sqlite":
+        for trigger in ("listing_fts_ai", "listing_fts_ad", "listing_fts_au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE IF EXISTS listing_fts"))
+        conn.execute(text("DROP VIEW IF EXISTS listing_fts_source"))
+    fill_plain_text(conn)
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIEW listing_fts_source AS"
+        " SELECT id, title_text AS title, description_text AS description FROM listing"
+    ))
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE listing_fts USING fts5("
+        " title, description, content='listing_fts_source', content_rowid='id',"
+        " tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    ))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_ai AFTER INSERT ON listing BEGIN
+            INSERT INTO listing_fts(rowid, title, description)
+            VALUES (new.id, new.title_text, new.description_text);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_ad AFTER DELETE ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title_text, old.description_text);
+        END"""))
+    conn.execute(text("""
+        CREATE TRIGGER listing_fts_au AFTER UPDATE OF title_text, description_text ON listing BEGIN
+            INSERT INTO listing_fts(listing_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title_text, old.description_text);
+            INSERT INTO listing_fts(rowid, title, description)
+            VALUES (new.id, new.title_text, new.description_text);
+        END"""))
+    conn.execute(text("INSERT INTO listing_fts(listing_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')"))
+    conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('rebuild')"))
+
+
+def fill_plain_text(conn: Connection, batch_size: int = 1000) -> int:
+    """Set title_text/description_text on rows written without them; returns the count."""
+    filled = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, title, description FROM listing WHERE title_text IS NULL LIMIT :n"
+        ), {"n": batch_size}).all()
+        if not rows:
+            return filled
+        conn.execute(
+            text("UPDATE listing SET title_text = :t, description_text = :d WHERE id = :id"),
+            [{"id": r.id, "t": html_to_text(r.title) or "", "d": html_to_text(r.description)} for r in rows],
+        )
+        filled += len(rows)
+
+
+@migration(9, "listing_data_version counter bumped by triggers on listing")
+def _listing_data_version(conn: Connection) -> None:
+    # API ETags name this version, so every worker (and any other writer)
+    # agrees on it, with or without the page cache.
+    from .models.base import Base
+    from .models import aggregates  # noqa: F401  (register tables)
+    Base.metadata.create_all(conn, tables=[Base.metadata.tables["listing_data_version"]])
+    conn.execute(text("INSERT INTO listing_data_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING"))
+    if conn.dialect.name != "sqlite":
+        return
+    bump = "UPDATE listing_data_version SET version = version + 1 WHERE id = 1;"
+    for trigger, event in (("listing_version_ai", "INSERT"), ("listing_version_ad", "DELETE"),
+                           ("listing_version_au", "UPDATE")):
+        conn.execute(text(f"CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {event} ON listing BEGIN {bump} END"))
+
+
+# ---- Runner ----
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)).scalar() or 0
+
+
+def pending(engine) -> List[Migration]:
+    with engine.connect() as conn:
+        version = current_version(conn)
+    return [m for m in MIGRATIONS if m.version > version]
+
+
+def upgrade(engine, target: Optional[int] = None, echo: Callable[[str], None] = lambda msg: None) -> List[Migration]:
+    """Apply pending migrations up to `target` (default: latest); returns those applied."""
+    schema_version.create(engine, checkfirst=True)
+    applied: List[Migration] = []
+    for m in MIGRATIONS:
+        if target is not None and m.version > target:
+            break
+        try:
+            with engine.begin() as conn:
+                if current_version(conn) >= m.version:
+                    continue
+                echo(f"applying {m.version}: {m.description}")
+                m.apply(conn)
+                conn.execute(schema_version.insert().values(version=m.version, description=m.description))
+        except IntegrityError:
+            # Another process recorded it concurrently; the step itself is idempotent.
+            continue
+        applied.append(m)
+    return applied
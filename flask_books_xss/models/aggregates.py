@@ -0,0 +1,27 @@
+from __future__ import annotations
+from sqlalchemy import BigInteger, Column, Integer
+from .base import Base
+
+
+# Maintained by triggers on `listing` (migration 6); see aggregates.py.
+class ListingUserStats(Base):
+    __tablename__ = "listing_user_stats"
+    user_id = Column(Integer, primary_key=True, autoincrement=False)
+    listing_count = Column(Integer, nullable=False)
+    price_sum = Column(BigInteger, nullable=False)
+    price_min = Column(Integer, nullable=False)
+    price_max = Column(Integer, nullable=False)
+
+
+class ListingPriceBucket(Base):
+    __tablename__ = "listing_price_histogram"
+    bucket = Column(Integer, primary_key=True, autoincrement=False)
+    listing_count = Column(Integer, nullable=False)
+    price_sum = Column(BigInteger, nullable=False)
+
+
+# One row, bumped by triggers on every write to `listing` (migration 9).
+class ListingDataVersion(Base):
+    __tablename__ = "listing_data_version"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    version = Column(BigInteger, nullable=False)
@@ -1,18 +1,37 @@
 from __future__ import annotations
-from sqlalchemy import (Column, DateTime, Integer, String, ForeignKey, Index, text, Text)
+from sqlalchemy import (Column, DateTime, Integer, String, ForeignKey, Index, Text)
 from sqlalchemy.orm import relationship
 from .base import Base
+from ..sanitizer import html_to_text
 from ..utils.time import utc_now
 
+
+def _plain_text_of(column: str):
+    # Inserts fill the *_text columns from the HTML; updates set them explicitly.
+    def default(context):
+        return html_to_text(context.get_current_parameters().get(column))
+    return default
+
 class Listing(Base):
     __tablename__ = "listing"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=True, index=True)
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), nullable=True)
     title = Column(String(200), nullable=False)
     description = Column(Text, nullable=True)
     price = Column(Integer, nullable=False)
+    # SANITIZER_VERSION that produced title/description; NULL if never sanitized.
+    sanitizer_version = Column(String(16), nullable=True)
     created_at = Column(DateTime(timezone=True), default=utc_now, nullable=False)
+    # title/description without markup, for the search index (migration 8).
+    title_text = Column(Text, default=_plain_text_of("title"), nullable=True)
+    description_text = Column(Text, default=_plain_text_of("description"), nullable=True)
     
     user = relationship("User", back_populates="listings")
-Index("ix_listing_user_created_desc", Listing.user_id, text("created_at DESC"))
\ No newline at end of file
+# One (key, id) index per sort order, with and without the owner in front, so
+# every keyset page is a range scan (see listings.SORTS). SQLite walks them in
+# either direction; the user_id-led ones also serve the foreign key.
+Index("ix_listing_created_id_desc", Listing.created_at.desc(), Listing.id.desc())
+Index("ix_listing_price_id", Listing.price, Listing.id)
+Index("ix_listing_user_created_id", Listing.user_id, Listing.created_at, Listing.id)
+Index("ix_listing_user_price_id", Listing.user_id, Listing.price, Listing.id)
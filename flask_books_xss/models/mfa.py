@@ -0,0 +1,9 @@
+from __future__ import annotations
+from sqlalchemy import Column, Integer, String, ForeignKey
+from .base import Base
+
+
+class UserMFA(Base):
+    __tablename__ = "user_mfa"
+    user_id = Column(Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True)
+    secret  = Column(String(64), nullable=False, unique=True)
@@ -1,16 +1,14 @@
 # flask_books_xss/oauth.py
 import secrets
 from urllib.parse import urlencode
-import requests
 from datetime import timedelta
-from sqlalchemy.exc import IntegrityError
 from flask import Blueprint, current_app, abort, redirect, request, session, url_for, flash, Response
-from sqlalchemy import select
-import secrets
+from sqlalchemy import update
 from .db import SessionLocal
+from .http_client import ProviderUnavailable, new_deadline, provider_client
 from .models.user import User, OAuthAccount
 from .utils.time import utc_now
-from typing import Dict
+from typing import Dict, Optional
 
 bp = Blueprint("oauth2", __name__)
 
@@ -65,40 +63,50 @@ def oauth2_callback(provider) -> Response:
     if not code:
         abort(401)
 
-    # ---- Token exchange ----
-    token_resp = requests.post(
-        p['token_url'],
-        data={
-            'client_id': p['client_id'],
-            'client_secret': p['client_secret'],
-            'code': code,
-            'grant_type': 'authorization_code',
-            'redirect_uri': url_for('oauth2.oauth2_callback', provider=provider, _external=True),
-        },
-        headers={'Accept': 'application/json'},
-        timeout=10
-    )
-    if token_resp.status_code != 200:
-        abort(401)
-
-    token_json = token_resp.json()
-    access_token = token_json.get('access_token')
-    refresh_token = token_json.get('refresh_token')
-    if not access_token:
-        abort(401)
-
-    expires_at = None
-    expires_in_key = p.get('token_expires_in_key')
-    if expires_in_key and token_json.get(expires_in_key):
-        try:
-            expires_at = utc_now() + timedelta(seconds=int(token_json[expires_in_key]))
-        except Exception:
-            expires_at = None
-
-    # ---- Userinfo ----
-    hdrs = {'Authorization': f'Bearer {access_token}', 'Accept': 'application/json'}
+    client = provider_client(provider)
+    deadline = new_deadline()
+    try:
+        # ---- Token exchange ----
+        token_resp = client.request(
+            "POST",
+            p['token_url'],
+            deadline,
+            data={
+                'client_id': p['client_id'],
+                'client_secret': p['client_secret'],
+                'code': code,
+                'grant_type': 'authorization_code',
+                'redirect_uri': url_for('oauth2.oauth2_callback', provider=provider, _external=True),
+            },
+            headers={'Accept': 'application/json'},
+        )
+        if token_resp.status_code != 200:
+            abort(401)
+
+        token_json = token_resp.json()
+        access_token = token_json.get('access_token')
+        refresh_token = token_json.get('refresh_token')
+        if not access_token:
+            abort(401)
+
+        expires_at = None
+        expires_in_key = p.get('token_expires_in_key')
+        if expires_in_key and token_json.get(expires_in_key):
+            try:
+                expires_at = utc_now() + timedelta(seconds=int(token_json[expires_in_key]))
+            except Exception:
+                expires_at = None
+
+        # ---- Userinfo ----
+        # Emails are fetched alongside userinfo rather than after it; the result
+        # is simply ignored when userinfo already carries an email.
+        hdrs = {'Authorization': f'Bearer {access_token}', 'Accept': 'application/json'}
+        emails_url = p['userinfo'].get('emails_url')
+        emails_future = client.get_async(emails_url, deadline, headers=hdrs) if emails_url else None
+        ui_resp = client.get_async(p['userinfo']['url'], deadline, headers=hdrs).result()
+    except ProviderUnavailable:
+        abort(503, description=f"{provider.capitalize()} is not responding, please try again later.")
 
-    ui_resp = requests.get(p['userinfo']['url'], headers=hdrs, timeout=10)
     if ui_resp.status_code != 200:
         abort(401)
     ui = ui_resp.json()
@@ -111,96 +119,79 @@ def oauth2_callback(provider) -> Response:
         abort(401, description="Could not obtain user ID from provider.")
 
     email = ui.get('email')
-    if not email:
-        emails_url = p['userinfo'].get('emails_url')
-        if emails_url:
-            emails_resp = requests.get(emails_url, headers=hdrs, timeout=10)
-            if emails_resp.status_code == 200:
-                emails = emails_resp.json() or []
-                primary_verified = next((e['email'] for e in emails if e.get('primary') and e.get('verified')), None)
-                any_verified = next((e['email'] for e in emails if e.get('verified')), None)
-                any_email = emails[0]['email'] if emails else None
-                email = primary_verified or any_verified or any_email
+    emails_resp = None
+    if not email and emails_future is not None:
+        try:
+            emails_resp = emails_future.result()
+        except ProviderUnavailable:
+            pass
+    if emails_resp is not None and emails_resp.status_code == 200:
+        emails = emails_resp.json() or []
+        primary_verified = next((e['email'] for e in emails if e.get('primary') and e.get('verified')), None)
+        any_verified = next((e['email'] for e in emails if e.get('verified')), None)
+        any_email = emails[0]['email'] if emails else None
+        email = primary_verified or any_verified or any_email
     if email:
         email = email.strip().lower()
 
-    # ---- Upsert link & user ----
-    with SessionLocal() as db:
-        oauth_link = db.execute(
-            select(OAuthAccount).where(
-                OAuthAccount.provider == provider,
-                OAuthAccount.provider_user_id == provider_user_id
-            )
-        ).scalar_one_or_none()
-
-        if oauth_link:
-            oauth_link.access_token = access_token
-            if hasattr(oauth_link, 'refresh_token'):
-                oauth_link.refresh_token = refresh_token
-            if hasattr(oauth_link, 'expires_at'):
-                oauth_link.expires_at = expires_at
-            db.commit()
-
-            session.clear()
-            session["uid"] = oauth_link.user_id
-            flash(f"Logged in with {provider.capitalize()}.", "success")
-            return redirect(url_for('web.index'))
-
-        user = None
-        if email:
-            user = db.execute(select(User).where(User.email == email)).scalar_one_or_none()
-        
-        if user is None:
-            user = User(
-                email=email or f"{provider_user_id}@{provider}.invalid",
-                password_hash=None,
-            )
-            db.add(user)
-            try:
-                db.commit()
-                db.refresh(user)
-            except IntegrityError:
-                db.rollback()
-                existing = db.execute(select(User).where(User.email == user.email)).scalar_one_or_none()
-                if existing is None:
-                    db.add(user)
-                    db.commit()
-                    db.refresh(user)
-                else:
-                    user = existing
-
-        # Create OAuth link
-        link = OAuthAccount(
-            user_id=user.id,
-            provider=provider,
-            provider_user_id=provider_user_id,
-            access_token=access_token,
-        )
-        if hasattr(link, 'refresh_token'):
-            link.refresh_token = refresh_token
-        if hasattr(link, 'expires_at'):
-            link.expires_at = expires_at
-
-        db.add(link)
-        try:
-            db.commit()
-        except IntegrityError:
-            db.rollback()
-            # Unique constraint race; fetch and continue
-            link = db.execute(
-                select(OAuthAccount).where(
-                    OAuthAccount.provider == provider,
-                    OAuthAccount.provider_user_id == provider_user_id
-                )
-            ).scalar_one()
+    user_id = upsert_oauth_account(provider, provider_user_id, email, access_token, refresh_token, expires_at)
 
     # Log in
     session.clear()
-    session["uid"] = user.id
+    session["uid"] = user_id
     flash(f"Logged in with {provider.capitalize()}.", "success")
     return redirect(url_for('web.index'))
 
 
+def _insert(db, table):
+    """Dialect-specific INSERT that supports ON CONFLICT ... RETURNING."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def upsert_oauth_account(provider: str, provider_user_id: str, email: Optional[str],
+                         access_token: str, refresh_token: Optional[str], expires_at) -> int:
+    """Find or create the user and link for a provider login; returns the user id.
+
+    Runs as one transaction. A returning login is a single UPDATE ... RETURNING;
+    a first login upserts the user on `user.email` and the link on
+    `uq_provider_user`, so parallel callbacks for the same account converge on
+    one user and one link instead of racing into IntegrityErrors.
+    """
+    now = utc_now()
+    tokens = dict(access_token=access_token, refresh_token=refresh_token, expires_at=expires_at, updated_at=now)
+    with SessionLocal() as db:
+        user_id = db.execute(
+            update(OAuthAccount)
+            .where(OAuthAccount.provider == provider, OAuthAccount.provider_user_id == provider_user_id)
+            .values(**tokens)
+            .returning(OAuthAccount.user_id)
+        ).scalar_one_or_none()
+
+        if user_id is None:
+            user_stmt = _insert(db, User).values(
+                email=email or f"{provider_user_id}@{provider}.invalid",
+                password_hash=None,
+            )
+            # No-op update so RETURNING also yields the id of an existing user.
+            user_stmt = user_stmt.on_conflict_do_update(
+                index_elements=[User.email], set_={"email": user_stmt.excluded.email}
+            ).returning(User.id)
+            new_user_id = db.execute(user_stmt).scalar_one()
+
+            link_stmt = _insert(db, OAuthAccount).values(
+                user_id=new_user_id, provider=provider, provider_user_id=provider_user_id, **tokens
+            )
+            link_stmt = link_stmt.on_conflict_do_update(
+                index_elements=[OAuthAccount.provider, OAuthAccount.provider_user_id],
+                set_={k: link_stmt.excluded[k] for k in tokens},
+            ).returning(OAuthAccount.user_id)
+            user_id = db.execute(link_stmt).scalar_one()
+        db.commit()
+    return user_id
 
 
 @bp.route('/logout')
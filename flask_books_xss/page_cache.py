@@ -0,0 +1,158 @@
+# page_cache.py
+"""Read-through cache for rendered public listing pages.
+
+Entries are keyed by a generation counter plus the caller's key, so any
+listing write only has to bump the generation to make every cached page stale;
+old entries then age out through TTL/LRU eviction.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from .utils.memory_store import MemoryStore
+
+PAGE_CACHE = os.getenv("PAGE_CACHE", "local").lower()
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "30"))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+
+
+class LocalBackend:
+    """Per-process LRU dict with TTL."""
+
+    shared = False
+
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._generation += 1
+            # Entries of older generations can never be hit again.
+            self._entries.clear()
+            return self._generation
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StoreBackend:
+    """Backend on a shared Redis-compatible client (or MemoryStore).
+
+    Eviction under memory pressure is left to the store's own LRU policy.
+    """
+
+    shared = True
+
+    def __init__(self, client, prefix: str = "pagecache:") -> None:
+        self.client = client
+        self.prefix = prefix
+
+    def generation(self) -> int:
+        return int(self.client.get(self.prefix + "gen") or 0)
+
+    def bump_generation(self) -> int:
+        return int(self.client.incr(self.prefix + "gen"))
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+
+class PageCache:
+    def __init__(self, backend=None, ttl: int = PAGE_CACHE_TTL, enabled: bool = True) -> None:
+        self.backend = backend if backend is not None else LocalBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def key(self, *parts: Hashable) -> str:
+        """Key for `parts` at the current generation; take it before reading the data.
+
+        A render that started before a write then stores its page under the
+        old generation, where nothing looks it up again.
+        """
+        if not self.enabled:
+            return ""
+        return ":".join([str(self.backend.generation()), *map(str, parts)])
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self.backend.get(key)
+        with self._stats_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if self.enabled:
+            self.backend.set(key, value, self.ttl)
+
+    def invalidate(self) -> None:
+        """Called after every committed listing write."""
+        self.backend.bump_generation()
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio_pct": round(100 * hits / total) if total else 0,
+        }
+
+
+def build_page_cache(spec: str = PAGE_CACHE) -> PageCache:
+    """`local` (default), `memory` (shared-store API, in-process), `off`, or a redis:// URL."""
+    if spec == "off":
+        return PageCache(enabled=False)
+    if spec == "memory":
+        return PageCache(StoreBackend(MemoryStore()))
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PAGE_CACHE points at Redis but the 'redis' package is not installed")
+        return PageCache(StoreBackend(redis.Redis.from_url(spec)))
+    return PageCache(LocalBackend())
+
+
+page_cache = build_page_cache()
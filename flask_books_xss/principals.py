@@ -0,0 +1,84 @@
+# principals.py
+"""Small TTL cache of the session principal used by auth.load_user.
+
+Holds only what views and templates need about the logged-in user, plus the
+user's TOTP secret for mfa.py, never the password hash. Both come from one
+user/user_mfa outer join. Writers in users.py/mfa.py invalidate entries
+locally; other worker processes see changes once the short TTL expires.
+"""
+from __future__ import annotations
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from sqlalchemy import select
+from .db import ReadSession
+from .models.mfa import UserMFA
+from .models.user import User
+
+PRINCIPAL_TTL = float(os.getenv("PRINCIPAL_TTL", "30"))
+PRINCIPAL_CACHE_MAX = int(os.getenv("PRINCIPAL_CACHE_MAX", "4096"))
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    id: int
+    email: str
+    is_active: bool
+    mfa_enabled: bool
+
+
+# uid -> (expires, principal, TOTP secret or None)
+_cache: "OrderedDict[int, Tuple[float, Principal, Optional[str]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _fetch(uid: int) -> Optional[Tuple[Principal, Optional[str]]]:
+    with ReadSession() as s:
+        row = s.execute(
+            select(User.id, User.email, User.is_active, UserMFA.secret)
+            .outerjoin(UserMFA, UserMFA.user_id == User.id)
+            .where(User.id == uid)
+        ).one_or_none()
+    if row is None:
+        return None
+    return make_principal(row[0], row[1], row[2], row[3]), row[3]
+
+
+def make_principal(uid: int, email: str, is_active, mfa_secret: Optional[str]) -> Principal:
+    return Principal(id=uid, email=email, is_active=bool(is_active), mfa_enabled=mfa_secret is not None)
+
+
+def prime(principal: Principal, mfa_secret: Optional[str]) -> None:
+    """Store a principal some other query already produced (e.g. authenticate)."""
+    with _lock:
+        _cache[principal.id] = (time.monotonic() + PRINCIPAL_TTL, principal, mfa_secret)
+        _cache.move_to_end(principal.id)
+        while len(_cache) > PRINCIPAL_CACHE_MAX:
+            _cache.popitem(last=False)
+
+
+def load_mfa_state(uid: int) -> Tuple[Optional[Principal], Optional[str]]:
+    """Principal and TOTP secret in at most one round-trip."""
+    with _lock:
+        hit = _cache.get(uid)
+        if hit is not None and hit[0] > time.monotonic():
+            _cache.move_to_end(uid)
+            return hit[1], hit[2]
+
+    found = _fetch(uid)
+    if found is None:
+        return None, None
+    prime(*found)
+    return found
+
+
+def load_principal(uid: int) -> Optional[Principal]:
+    return load_mfa_state(uid)[0]
+
+
+def invalidate_principal(uid: int) -> None:
+    with _lock:
+        _cache.pop(uid, None)
@@ -1,42 +1,28 @@
 # routes.py
 from __future__ import annotations
 
-import re
-import unicodedata
 from decimal import InvalidOperation
 
-from bleach.sanitizer import Cleaner
 from flask import (
     Blueprint,
+    abort,
     flash,
     g,
     redirect,
     render_template,
     request,
+    session,
     url_for,
 )
 
-from .listings import create_listing, list_public, list_mine
+from .aggregates import user_stats
+from .listings import DEFAULT_SORT, create_listing, list_public_page, list_mine
+from .page_cache import page_cache
+from .search import search_listings
+from .sanitizer import SANITIZER_VERSION, sanitize_html, _ALLOWED_TAGS, _ALLOWED_ATTRS  # noqa: F401
 
 web = Blueprint("web", __name__)
 
-# ---- HTML sanitizer ----
-_ALLOWED_TAGS = ["b", "i", "em", "strong", "a", "p"]
-_ALLOWED_ATTRS = {"a": ["href", "title", "rel"]}
-_HTML_CLEANER = Cleaner(
-    tags=_ALLOWED_TAGS,
-    attributes=_ALLOWED_ATTRS,
-    protocols=["http", "https"],
-    strip=True,
-    strip_comments=True,
-)
-
-def sanitize_html(value: str, *, max_len: int = 500) -> str:
-    val = unicodedata.normalize("NFC", value or "").strip()
-    val = _HTML_CLEANER.clean(val)
-    val = re.sub(r"\s+", " ", val)
-    return val[:max_len]
-
 @web.context_processor
 def inject_flags():
     return {
@@ -46,7 +32,30 @@ def inject_flags():
 # ---------- Pages ----------
 @web.get("/")
 def index():
-    return render_template("index.html", books=list_public())
+    after, before = request.args.get("after"), request.args.get("before")
+    # The nav bar shows the logged-in email, so pages are cached per viewer.
+    # Pages carrying flash messages are one-off and never cached.
+    viewer = f"u{g.user.id}" if g.user else "anon"
+    cacheable = "_flashes" not in session
+    if cacheable:
+        cache_key = page_cache.key(viewer, after or "", before or "")
+        html = page_cache.get(cache_key)
+        if html is not None:
+            return html
+
+    try:
+        page = list_public_page(after=after, before=before)
+    except ValueError:
+        abort(400)
+    html = render_template(
+        "index.html",
+        books=page["items"],
+        next_cursor=page["next_cursor"],
+        prev_cursor=page["prev_cursor"],
+    )
+    if cacheable:
+        page_cache.set(cache_key, html)
+    return html
 
 @web.post("/list")
 def list_book():
@@ -72,12 +81,27 @@ def list_book():
         flash("Title is required.", "error")
         return redirect(url_for("web.index"))
 
-    create_listing(user_id=g.user.id, title=title, price=price, description=description or None)
+    create_listing(user_id=g.user.id, title=title, price=price, description=description or None,
+                   sanitizer_version=SANITIZER_VERSION)
     return redirect(url_for("web.index"))
 
+@web.get("/search")
+def search():
+    q = request.args.get("q", "").strip()
+    page = request.args.get("page", 1, type=int)
+    try:
+        results = search_listings(q, page=page)
+    except ValueError:
+        abort(400)
+    return render_template("search.html", q=q, results=results)
+
 @web.get("/mine")
 def my_listings():
     if not g.user:
         return redirect(url_for("auth.login"))
-    rows = list_mine(g.user.id)
-    return render_template("my_listings.html", rows=rows)
+    sort = request.args.get("sort") or DEFAULT_SORT
+    try:
+        rows = list_mine(g.user.id, sort=sort)
+    except ValueError:
+        abort(400)
+    return render_template("my_listings.html", rows=rows, sort=sort, stats=user_stats(g.user.id))
@@ -0,0 +1,76 @@
+# sanitizer.py
+"""HTML sanitizing for user-supplied listing text.
+
+Listings are stored already sanitized, stamped with SANITIZER_VERSION. The
+version is derived from the allow-list, so changing `_ALLOWED_TAGS`,
+`_ALLOWED_ATTRS` or `_ALLOWED_PROTOCOLS` makes `flask listings resanitize`
+re-process exactly the rows written under the old rules.
+"""
+from __future__ import annotations
+import hashlib
+import html
+import json
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Optional
+
+from .instrumentation import span
+
+_ALLOWED_TAGS = ["b", "i", "em", "strong", "a", "p"]
+_ALLOWED_ATTRS = {"a": ["href", "title", "rel"]}
+_ALLOWED_PROTOCOLS = ["http", "https"]
+
+SANITIZER_VERSION = hashlib.sha256(
+    json.dumps([_ALLOWED_TAGS, _ALLOWED_ATTRS, _ALLOWED_PROTOCOLS], sort_keys=True).encode()
+).hexdigest()[:12]
+
+SANITIZE_CACHE_SIZE = int(os.getenv("SANITIZE_CACHE_SIZE", "1024"))
+# Inputs longer than this multiple of max_len bypass the cache, so it pins at
+# most SANITIZE_CACHE_SIZE * 4 * max_len characters however large the form
+# fields are (the longest field, a 2000-char description, bounds it at ~8M).
+_CACHE_INPUT_FACTOR = 4
+
+_WS = re.compile(r"\s+")
+# Characters bleach would escape, drop or replace. Text without any of them
+# comes out of the cleaner unchanged, so it can skip the html5lib round trip.
+_NEEDS_CLEANING = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f&<>]")
+_TAG = re.compile(r"<[^>]*>")
+
+
+@lru_cache(maxsize=None)
+def _cleaner():
+    # bleach (and html5lib under it) is only imported once something is sanitized.
+    from bleach.sanitizer import Cleaner
+    return Cleaner(
+        tags=_ALLOWED_TAGS,
+        attributes=_ALLOWED_ATTRS,
+        protocols=_ALLOWED_PROTOCOLS,
+        strip=True,
+        strip_comments=True,
+    )
+
+
+def _sanitize(value: str, max_len: int) -> str:
+    val = unicodedata.normalize("NFC", value).strip()
+    if _NEEDS_CLEANING.search(val):
+        val = _cleaner().clean(val)
+    val = _WS.sub(" ", val)
+    return val[:max_len]
+
+_sanitize_cached = lru_cache(maxsize=SANITIZE_CACHE_SIZE)(_sanitize)
+
+def sanitize_html(value: str, *, max_len: int = 500) -> str:
+    value = value or ""
+    with span("sanitize"):
+        if len(value) > _CACHE_INPUT_FACTOR * max_len:
+            return _sanitize(value, max_len)
+        return _sanitize_cached(value, max_len)
+
+def html_to_text(value: Optional[str]) -> Optional[str]:
+    """Stored HTML as plain text (tags dropped, entities decoded), for the search index."""
+    if value is None:
+        return None
+    # A space per tag keeps "a<br>b" two words; sanitized text has no bare "<".
+    return html.unescape(_TAG.sub(" ", value))
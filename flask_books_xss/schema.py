@@ -1,4 +1,38 @@
+import click
+from flask.cli import AppGroup
+
+db_cli = AppGroup("db", help="Database schema commands.")
+
+
 def init_db():
+    """Bring the schema up to date (all pending migrations)."""
     from .db import engine
-    from .models.user import Base
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    from .migrations import upgrade
+    return upgrade(engine)
+
+
+def pending_migrations():
+    from .db import engine
+    from .migrations import pending
+    return pending(engine)
+
+
+@db_cli.command("upgrade")
+@click.option("--to", "target", type=int, default=None, help="Stop at this version.")
+def upgrade_command(target):
+    """Apply pending migrations (run once per deploy when startup DDL is off)."""
+    from .db import engine
+    from .migrations import upgrade
+    applied = upgrade(engine, target, echo=click.echo)
+    click.echo(f"applied {len(applied)} migration(s)" if applied else "already up to date")
+
+
+@db_cli.command("current")
+def current_command():
+    """Show the applied schema version and any pending migrations."""
+    from .db import engine
+    from .migrations import current_version, pending
+    with engine.connect() as conn:
+        click.echo(f"schema version {current_version(conn)}")
+    for m in pending(engine):
+        click.echo(f"pending {m.version}: {m.description}")
@@ -0,0 +1,87 @@
+# search.py
+"""Full-text search over listing titles and descriptions (SQLite FTS5).
+
+`listing_fts` is an external-content FTS5 table kept in sync with `listing`
+by triggers, so every write path (the web form, bulk import, resanitize,
+cascading user deletes) is covered without hooks in Python. It indexes
+`title_text`/`description_text`, the text with markup stripped and entities
+decoded that the app stores next to the HTML (migration 8), so tag and
+attribute names never match. The triggers use no app-defined SQL functions,
+so other clients can still write `listing`; rows they insert without the
+text columns become searchable after `flask search rebuild`. Results are ranked with bm25, title matches weighted above
+description matches (see the migration), and only the requested page is
+joined back to `listing`.
+
+Queries are plain words; every word must match. A trailing `*` makes a word
+a prefix match (`neuro*`). Any FTS5 syntax in the input is neutralised by
+quoting each word.
+"""
+from __future__ import annotations
+import re
+from typing import Dict, List
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DateTime, Integer, String, text
+
+from .db import ReadSession, engine
+from .migrations import fill_plain_text
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE = 50  # OFFSET cost grows with depth; nobody reads page 51 of search results
+MAX_QUERY_TERMS = 8
+
+_TERM = re.compile(r"(\w+)(\*?)")
+
+_SEARCH_SQL = text("""
+SELECT l.id, l.title, l.price, l.created_at, l.user_id
+FROM (
+    SELECT rowid, rank FROM listing_fts WHERE listing_fts MATCH :query
+    ORDER BY rank LIMIT :limit OFFSET :offset
+) AS hit
+JOIN listing AS l ON l.id = hit.rowid
+ORDER BY hit.rank
+""").columns(id=Integer, title=String, price=Integer, created_at=DateTime(timezone=True), user_id=Integer)
+
+
+def build_match_query(q: str) -> str:
+    """User input -> FTS5 MATCH expression, or '' when nothing searchable is left."""
+    terms = []
+    for word, star in _TERM.findall(q or "")[:MAX_QUERY_TERMS]:
+        terms.append(f'"{word}"' + ("*" if star else ""))
+    return " ".join(terms)
+
+
+def search_listings(q: str, *, page: int = 1, limit: int = SEARCH_PAGE_SIZE) -> Dict:
+    """One page of ranked matches: {"items": [...], "page": n, "has_more": bool}."""
+    if page < 1 or page > MAX_SEARCH_PAGE:
+        raise ValueError("invalid_page")
+    match = build_match_query(q)
+    if not match:
+        return {"items": [], "page": page, "has_more": False}
+    with ReadSession() as s:
+        rows = s.execute(_SEARCH_SQL, {"query": match, "limit": limit + 1, "offset": (page - 1) * limit}).all()
+    items: List[Dict] = [
+        {
+            "id": r.id,
+            "title": r.title,
+            "price": r.price,
+            "created_at": r.created_at.isoformat(),
+            "user_id": r.user_id,
+        }
+        for r in rows[:limit]
+    ]
+    return {"items": items, "page": page, "has_more": len(rows) > limit}
+
+
+# ---- CLI ----
+search_cli = AppGroup("search", help="Full-text search index.")
+
+@search_cli.command("rebuild")
+def rebuild() -> None:
+    """Re-index every listing from scratch and merge the index b-trees."""
+    with engine.begin() as conn:
+        filled = fill_plain_text(conn)
+        conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('rebuild')"))
+        conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('optimize')"))
+    click.echo(f"Search index rebuilt ({filled} rows without plain text filled in).")
@@ -1,16 +1,315 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import get_all_start_methods, get_context
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import click
 from argon2 import PasswordHasher
+from flask.cli import AppGroup
+from .instrumentation import span
+
+# Defaults follow the OWASP Argon2id baseline; tune per host with
+# `flask hashing calibrate`. Hashes made with other parameters are upgraded on
+# the next successful login (see users.authenticate).
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB (19 MiB)
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "2"))          # Iterations
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))      # Lanes/threads
 
 ph = PasswordHasher(
-    memory_cost=19456,  # Memory cost in kibibytes (19 MiB)
-    parallelism=1,      # Number of parallel threads
-    time_cost=2         # Iteration count
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM,
+    time_cost=ARGON2_TIME_COST,
 )
 
+# ---- Hashing pool ----
+# Argon2 is CPU- and memory-heavy, so it runs in a small dedicated process pool
+# instead of on request threads. HASH_WORKERS=0 hashes inline (dev/tests).
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", str(max(HASH_WORKERS, 1) * 4)))
+HASH_TIMEOUT = float(os.getenv("HASH_TIMEOUT", "10"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))
+# The pool starts lazily on a request thread, and forking a threaded process
+# can copy a lock some other thread holds; forkserver/spawn start clean.
+HASH_MP_CONTEXT = os.getenv("HASH_MP_CONTEXT") or (
+    "forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+# Host-wide cap for several server processes that each own a pool (serve.py
+# sets it). A slot is an flock on a file here; the OS drops the lock of a
+# process that dies, so a killed worker never leaks one.
+HASH_SLOT_DIR = Path(os.getenv("HASH_SLOT_DIR", "instance/hash-slots"))
+
+try:
+    import fcntl
+    import resource
+except ImportError:  # Windows: no host-wide cap, no peak RSS in calibrate
+    fcntl = resource = None
+
+_host_slots: List = []   # open slot files; only filled in pool processes
+
+
+def _init_pool_process(host_slots: int) -> None:
+    if host_slots <= 0 or fcntl is None:
+        return
+    HASH_SLOT_DIR.mkdir(parents=True, exist_ok=True)
+    _host_slots.extend(open(HASH_SLOT_DIR / f"{i}.lock", "a") for i in range(host_slots))
+
+
+@contextmanager
+def _host_slot() -> Iterator[None]:
+    if not _host_slots:
+        yield
+        return
+    for held in _host_slots:
+        try:
+            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            continue
+    else:
+        held = _host_slots[os.getpid() % len(_host_slots)]
+        fcntl.flock(held, fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(held, fcntl.LOCK_UN)
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full; the request should be retried later (503)."""
+
+
+def _hash_job(pw: str):
+    with _host_slot():
+        started = time.monotonic()
+        result = ph.hash(pw)
+        return result, started, time.monotonic()
+
+
+def _verify_job(hash_: str, pw: str):
+    with _host_slot():
+        started = time.monotonic()
+        try:
+            ok = ph.verify(hash_, pw)
+        except Exception:
+            ok = False
+        return ok, started, time.monotonic()
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count, self.total, self.max = 0, 0.0, 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class HashPool:
+    """Bounded executor for Argon2 work.
+
+    At most `queue_max` jobs may be queued or running at once; beyond that
+    callers fail fast with HashingBusy instead of piling up on the pool.
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_max: int = HASH_QUEUE_MAX,
+                 timeout: float = HASH_TIMEOUT) -> None:
+        self.workers = workers
+        self.queue_max = queue_max
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(queue_max)
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.host_slots = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.wait = _Timing()
+        self.latency = _Timing()
+
+    def configure(self, workers: int, queue_max: int, host_slots: int = 0) -> None:
+        """Resize the pool before first use (serve.py shares the CPUs among workers).
+
+        With `host_slots`, at most that many hashes run at once across every
+        process on the host that configured the same HASH_SLOT_DIR.
+        """
+        with self._lock:
+            if self._executor is not None:
+                raise RuntimeError("hash pool already started")
+            self.workers = workers
+            self.queue_max = queue_max
+            self.host_slots = host_slots
+            self._slots = threading.BoundedSemaphore(queue_max)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=get_context(HASH_MP_CONTEXT),
+                    initializer=_init_pool_process, initargs=(self.host_slots,))
+            return self._executor
+
+    def _after_fork(self) -> None:
+        # The parent's executor, locks and counters are meaningless in a child.
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.queue_max)
+        self._executor = None
+        self.in_flight = 0
+
+    def reset(self) -> None:
+        """Drop the executor after a worker crash; it is recreated on next use."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self.in_flight += 1
+        submitted = time.monotonic()
+        if self.workers <= 0:
+            try:
+                result, started, finished = fn(*args)
+            finally:
+                self._release()
+        else:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                self._release()
+                self.reset()
+                raise HashingBusy()
+            # The slot is freed when the job ends, not when the caller stops
+            # waiting: a job that outlives HASH_TIMEOUT still occupies a worker.
+            future.add_done_callback(self._release)
+            try:
+                result, started, finished = future.result(self.timeout)
+            except FutureTimeout:
+                raise HashingBusy()
+            except BrokenProcessPool:
+                self.reset()
+                raise HashingBusy()
+        # time.monotonic() is system-wide, so child timestamps are comparable.
+        self.wait.observe(max(0.0, started - submitted))
+        self.latency.observe(finished - started)
+        return result
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.in_flight,
+            "queue_max": self.queue_max,
+            "rejected_total": self.rejected,
+            "wait_seconds_count": self.wait.count,
+            "wait_seconds_sum": self.wait.total,
+            "wait_seconds_max": self.wait.max,
+            "hash_seconds_count": self.latency.count,
+            "hash_seconds_sum": self.latency.total,
+            "hash_seconds_max": self.latency.max,
+        }
+
+
+hash_pool = HashPool()
+os.register_at_fork(after_in_child=hash_pool._after_fork)
+
+
 def hash_password(pw: str) -> str:
-    return ph.hash(pw)
+    with span("argon2"):
+        return hash_pool.run(_hash_job, pw)
 
 def verify_password(hash_: str, pw: str) -> bool:
-    try:
-        return ph.verify(hash_, pw)
-    except:
-        return False
\ No newline at end of file
+    if not hash_:
+        return False
+    with span("argon2"):
+        return hash_pool.run(_verify_job, hash_, pw)
+
+def needs_rehash(hash_: str) -> bool:
+    """True if `hash_` was made with parameters other than the current ones."""
+    return ph.check_needs_rehash(hash_)
+
+# ---- Calibration ----
+hashing_cli = AppGroup("hashing", help="Password hashing tools.")
+
+def _bench(memory_cost: int, time_cost: int, parallelism: int, rounds: int) -> float:
+    """Median seconds per hash for the given parameters on this host."""
+    hasher = PasswordHasher(memory_cost=memory_cost, time_cost=time_cost, parallelism=parallelism)
+    samples: List[float] = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        hasher.hash("calibration-password")
+        samples.append(time.perf_counter() - t0)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def _peak_rss_kib() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+def _bench_job(memory_cost: int, time_cost: int, parallelism: int, rounds: int) -> Tuple[float, Optional[int]]:
+    # Runs in a fresh child, so its ru_maxrss only ever saw this candidate.
+    before = _peak_rss_kib() if resource else None
+    seconds = _bench(memory_cost, time_cost, parallelism, rounds)
+    return seconds, (_peak_rss_kib() - before) if resource else None
+
+def _bench_isolated(memory_cost: int, time_cost: int, parallelism: int, rounds: int) -> Tuple[float, Optional[int]]:
+    """Median seconds per hash and the peak RSS (KiB) hashing added, measured in a child process."""
+    with ProcessPoolExecutor(1, mp_context=get_context(HASH_MP_CONTEXT)) as executor:
+        return executor.submit(_bench_job, memory_cost, time_cost, parallelism, rounds).result()
+
+@hashing_cli.command("calibrate")
+@click.option("--target-per-core", default=10.0, show_default=True,
+              help="Logins per second each core should sustain.")
+@click.option("--max-memory-mib", default=64, show_default=True,
+              help="Upper bound for memory_cost per hash.")
+@click.option("--parallelism", default=1, show_default=True)
+@click.option("--rounds", default=5, show_default=True, help="Hashes per candidate.")
+def calibrate(target_per_core: float, max_memory_mib: int, parallelism: int, rounds: int) -> None:
+    """Benchmark Argon2 on this host and suggest ARGON2_* settings.
+
+    Each candidate runs in a fresh child process, so its peak RSS is the
+    memory one concurrent hash really costs, not just memory_cost.
+    """
+    budget = 1.0 / target_per_core
+    click.echo(f"Budget per hash: {budget * 1000:.1f} ms ({target_per_core:g} logins/s/core)")
+    click.echo(f"Current: m={ARGON2_MEMORY_COST} KiB t={ARGON2_TIME_COST} p={ARGON2_PARALLELISM}")
+    click.echo(f"{'memory':>10} {'t':>3} {'ms/hash':>9} {'peak RSS':>10} {'logins/s/core':>14}")
+
+    best = None
+    memory_mib = 19
+    while memory_mib <= max_memory_mib:
+        memory_cost = memory_mib * 1024
+        time_cost = 1
+        while True:
+            seconds, peak_kib = _bench_isolated(memory_cost, time_cost, parallelism, rounds)
+            peak = f"{peak_kib / 1024:.1f} MiB" if peak_kib is not None else "n/a"
+            click.echo(f"{memory_mib:>7} MiB {time_cost:>3} {seconds * 1000:>9.1f} {peak:>10} {1 / seconds:>14.1f}")
+            if seconds > budget:
+                break
+            # Prefer more memory first, then more iterations, within budget.
+            best = (memory_cost, time_cost, seconds, peak)
+            time_cost += 1
+        if time_cost == 1:
+            break
+        memory_mib *= 2
+
+    if best is None:
+        click.echo("No parameters fit the budget; lower --target-per-core or add cores.")
+        return
+    memory_cost, time_cost, seconds, peak = best
+    click.echo("")
+    click.echo(f"Suggested ({seconds * 1000:.1f} ms/hash, {peak} peak RSS per concurrent hash):")
+    click.echo(f"ARGON2_MEMORY_COST={memory_cost}")
+    click.echo(f"ARGON2_TIME_COST={time_cost}")
+    click.echo(f"ARGON2_PARALLELISM={parallelism}")
@@ -0,0 +1,117 @@
+# serve.py
+"""Production server: gunicorn, preforked workers with threads, app preloaded.
+
+    python -m flask_books_xss.serve
+
+The app is created once in the master before forking, so imports, schema
+setup and compiled templates are shared copy-on-write by every worker.
+Per-process state that must not cross the fork (DB pools, HTTP clients, the
+hash pool) is reset by the os.register_at_fork hooks in the modules that own
+it.
+
+    SERVE_BIND       address to listen on (default 0.0.0.0:4000)
+    SERVE_WORKERS    worker processes (default: WEB_CONCURRENCY, else 2 x CPUs + 1)
+    SERVE_THREADS    threads per worker (default 4)
+    SERVE_TIMEOUT    seconds before a silent worker is restarted (default 30)
+
+Every worker has its own memory, so backends that keep state in-process
+misbehave with more than one: rate limits multiply by the worker count, a
+TOTP code can be replayed on another worker, and a per-process page cache
+serves stale pages after a write.
+The Docker image defaults to the SQLite rate-limit store and no page cache;
+point PAGE_CACHE and TOTP_REPLAY_STORE at Redis to share them. Any backend
+left process-local is reported at startup. Unless HASH_WORKERS is set,
+Argon2 gets half the CPUs for the whole server: each worker's pool gets a
+share of that, and lock-file slots (see security.HASH_SLOT_DIR) cap the
+hashes running at once across all workers.
+
+Settings are read from the real environment (Docker ENV, systemd, the
+shell); `.env` is not loaded. The package reads its configuration when
+`python -m` imports it, before this module could load a file.
+"""
+from __future__ import annotations
+import logging
+import os
+from typing import Dict, List
+
+from gunicorn.app.base import BaseApplication
+
+log = logging.getLogger(__name__)
+
+
+def _cpus() -> int:
+    # Respects taskset/cgroup CPU pinning where the platform exposes it.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_options() -> Dict[str, object]:
+    cpus = _cpus()
+    return {
+        "bind": os.getenv("SERVE_BIND", "0.0.0.0:4000"),
+        "workers": int(os.getenv("SERVE_WORKERS") or os.getenv("WEB_CONCURRENCY") or 2 * cpus + 1),
+        "threads": int(os.getenv("SERVE_THREADS", "4")),
+        "timeout": int(os.getenv("SERVE_TIMEOUT", "30")),
+        "preload_app": True,
+        "accesslog": "-",
+    }
+
+
+def hash_budget(cpus: int) -> int:
+    """Argon2 hashes allowed to run at once on the whole server."""
+    return max(1, cpus // 2)
+
+
+def process_local_backends() -> List[str]:
+    """Loaded backends that keep their state inside each worker."""
+    from .page_cache import page_cache
+    from .totp_replay import LocalReplayStore, replay_store
+    from .utils.limiter import RATELIMIT_STORAGE_URI
+    from .utils.memory_store import MemoryStore
+
+    found = []
+    if RATELIMIT_STORAGE_URI.startswith("memory://"):
+        found.append("RATELIMIT_STORAGE_URI=memory:// multiplies every limit by the worker count")
+    backend = page_cache.backend
+    if page_cache.enabled and (not backend.shared or isinstance(backend.client, MemoryStore)):
+        found.append("PAGE_CACHE is per process: other workers serve stale pages after a write")
+    if isinstance(replay_store, LocalReplayStore) or isinstance(replay_store.client, MemoryStore):
+        found.append("TOTP_REPLAY_STORE is per process: a code can be replayed on another worker")
+    return found
+
+
+class Server(BaseApplication):
+    def __init__(self, options: Dict[str, object]) -> None:
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from . import create_app
+        return create_app()
+
+
+def main() -> None:
+    from .security import hash_pool
+
+    options = default_options()
+    workers = int(options["workers"])
+    if "HASH_WORKERS" not in os.environ:
+        # The pool starts lazily in each worker, so resizing it here covers all
+        # of them. Pools may add up to more processes than the budget (at least
+        # one per worker); the host slots keep the running hashes within it.
+        budget = hash_budget(_cpus())
+        share = -(-budget // workers)
+        hash_pool.configure(share, int(os.getenv("HASH_QUEUE_MAX") or share * 4), host_slots=budget)
+    if workers > 1:
+        for problem in process_local_backends():
+            log.warning("%d workers: %s", workers, problem)
+    Server(options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# totp_replay.py
+"""Reject reuse of TOTP codes without touching the database.
+
+Each backend keeps the newest accepted timestep per user and rejects any
+code at or before it, so a code works once and an older code still inside
+the window is refused after a newer one was used (RFC 6238 §5.2). Entries
+expire once the timestep has left the 90-second verification window
+(valid_window=1 on a 30-second interval), so memory stays proportional to
+users who verified recently.
+
+TOTP_REPLAY_STORE selects the backend: ``local`` (per process, default),
+``memory`` (shared-store code path on an in-process stand-in) or a redis://
+URL for multi-worker deployments.
+"""
+from __future__ import annotations
+import hmac
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+import pyotp
+
+from .utils.memory_store import MemoryStore
+
+TOTP_REPLAY_STORE = os.getenv("TOTP_REPLAY_STORE", "local").lower()
+VALID_WINDOW = 1
+REPLAY_TTL = 90  # seconds: (2 * VALID_WINDOW + 1) * 30s interval
+
+
+class LocalReplayStore:
+    """Newest accepted timestep per user, in a per-process dict."""
+
+    def __init__(self, ttl: int = REPLAY_TTL) -> None:
+        self.ttl = ttl
+        self._last: Dict[int, Tuple[int, float]] = {}  # uid -> (timestep, expires)
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + ttl
+
+    def claim(self, user_id: int, timestep: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._last = {uid: v for uid, v in self._last.items() if v[1] > now}
+                self._next_sweep = now + self.ttl
+            last = self._last.get(user_id)
+            if last is not None and last[1] > now and timestep <= last[0]:
+                return False
+            self._last[user_id] = (timestep, now + self.ttl)
+            return True
+
+
+class SharedReplayStore:
+    """Newest accepted timestep per user in a Redis-compatible store (Redis >= 6.2).
+
+    The step is the score of a one-member sorted set. ZADD GT CH is a
+    server-side compare-and-set: it only raises the score, and reports a
+    change only when it did, so concurrent workers claiming the same or an
+    older step all see 0 but one.
+    """
+
+    def __init__(self, client, ttl: int = REPLAY_TTL, prefix: str = "totp-last:") -> None:
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def claim(self, user_id: int, timestep: int) -> bool:
+        key = f"{self.prefix}{user_id}"
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zadd(key, {"step": timestep}, gt=True, ch=True)
+        pipe.expire(key, self.ttl)
+        changed, _ = pipe.execute()
+        return bool(changed)
+
+
+def build_replay_store(spec: str = TOTP_REPLAY_STORE):
+    if spec == "memory":
+        return SharedReplayStore(MemoryStore())
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("TOTP_REPLAY_STORE points at Redis but the 'redis' package is not installed")
+        return SharedReplayStore(redis.Redis.from_url(spec))
+    return LocalReplayStore()
+
+
+replay_store = build_replay_store()
+
+
+def verify_once(user_id: int, secret: str, code: str) -> bool:
+    """Like TOTP.verify(code, valid_window=1), but each code only works once."""
+    totp = pyotp.TOTP(secret)
+    current = int(time.time()) // totp.interval
+    code = str(code)
+    for step in range(current - VALID_WINDOW, current + VALID_WINDOW + 1):
+        if hmac.compare_digest(totp.generate_otp(step), code):
+            return replay_store.claim(user_id, step)
+    return False
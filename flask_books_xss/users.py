@@ -1,11 +1,13 @@
 # users.py
 from typing import Optional
-from sqlalchemy import select, update
+from sqlalchemy import case, select, update
 from sqlalchemy.exc import IntegrityError
-from .db import SessionLocal
+from .db import SessionLocal, ReadSession
+from .models.mfa import UserMFA
 from .models.user import User
-from .security import hash_password, verify_password
-from .utils.time import utc_now
+from .principals import invalidate_principal, make_principal, prime
+from .security import hash_password, verify_password, needs_rehash
+from .utils.time import as_utc, utc_now
 
 import datetime
 
@@ -25,33 +27,68 @@ def create_user(email: str, password: str) -> User:
         s.refresh(u)
         return u
 
+def _failure_update(user_id: int, now: datetime.datetime):
+    """Count a failed attempt and, at the threshold, lock, all in one statement.
+
+    SET expressions see the pre-update row, so concurrent failures can't lose
+    increments the way a read-modify-write would.
+    """
+    attempts = User.failed_attempts + 1
+    return (
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            failed_attempts=attempts,
+            locked_until=case(
+                (attempts >= MAX_FAILED_ATTEMPTS, now + datetime.timedelta(minutes=LOCK_MINUTES)),
+                else_=User.locked_until,
+            ),
+            updated_at=now,
+        )
+        .returning(User.failed_attempts, User.locked_until)
+    )
+
 def authenticate(email: str, password: str) -> Optional[User]:
+    """Check credentials with one read and at most one write.
+
+    Locked accounts are rejected before paying for Argon2, and a successful
+    login only writes when there is fail state to clear or a hash to upgrade.
+    The same read picks up the TOTP secret and primes the principal cache, so
+    the login views need no further queries.
+    """
     email = email.strip().lower()
+    with ReadSession() as s:
+        u = s.execute(
+            select(User.id, User.email, User.password_hash, User.is_active,
+                   User.failed_attempts, User.locked_until, User.created_at, UserMFA.secret)
+            .outerjoin(UserMFA, UserMFA.user_id == User.id)
+            .where(User.email == email)
+        ).one_or_none()
+    # The read transaction is closed before hashing so it can't hold SQLite locks.
+    if not u or is_locked(u):
+        return None
+
     now = utc_now()
-    with SessionLocal() as s:
-        u: User | None = s.execute(select(User).filter_by(email=email)).scalar_one_or_none()
-        
-        if not u:
-            return None
-        
-        
-        if not verify_password(u.password_hash, password):
-            new_failed = (u.failed_attempts or 0) + 1
-            locked_until = (
-                now + datetime.timedelta(minutes=LOCK_MINUTES) if new_failed >= MAX_FAILED_ATTEMPTS else None
-            )
-            s.execute(
-                update(User)
-                .where(User.id == u.id)
-                .values(failed_attempts=new_failed,
-                locked_until=locked_until if locked_until else u.locked_until,
-                updated_at=now)
-            )
+    if not verify_password(u.password_hash, password):
+        with SessionLocal() as s:
+            s.execute(_failure_update(u.id, now)).one_or_none()
             s.commit()
-            return None
-        s.execute(update(User).where(User.id == u.id).values(failed_attempts=0, locked_until=None, updated_at=now))
-        s.commit()
-        return User(id=u.id, email=u.email, password_hash=u.password_hash, is_active=u.is_active, created_at=u.created_at)
+        invalidate_principal(u.id)
+        return None
+
+    values = {}
+    if u.failed_attempts or u.locked_until is not None:
+        values.update(failed_attempts=0, locked_until=None)
+    if needs_rehash(u.password_hash):
+        # Parameters changed since this hash was made; upgrade transparently.
+        values["password_hash"] = hash_password(password)
+    if values:
+        with SessionLocal() as s:
+            s.execute(update(User).where(User.id == u.id).values(updated_at=now, **values))
+            s.commit()
+    prime(make_principal(u.id, u.email, u.is_active, u.secret), u.secret)
+    return User(id=u.id, email=u.email, password_hash=values.get("password_hash", u.password_hash),
+                is_active=u.is_active, created_at=u.created_at)
 
 def get_user(user_id: int) -> Optional[User]:
     with SessionLocal() as s:
@@ -62,30 +99,20 @@ def get_user(user_id: int) -> Optional[User]:
 
 
 def is_locked(user: User) -> bool:
-    return bool(user.locked_until is not None and user.locked_until > utc_now())
+    return bool(user.locked_until is not None and as_utc(user.locked_until) > utc_now())
 
 def bump_failure(user: User) -> None:
-    now = utc_now()
     with SessionLocal() as s:
-        u = s.get(User, user.id)
-        if not u:
-            return
-        new_failed = (u.failed_attempts or 0) + 1
-        locked_until = (
-            now + datetime.timedelta(minutes=LOCK_MINUTES) if new_failed >= MAX_FAILED_ATTEMPTS else None
-        )
-        u.failed_attempts = new_failed
-        if locked_until:
-            u.locked_until = locked_until
-        u.updated_at = now
+        s.execute(_failure_update(user.id, utc_now())).one_or_none()
         s.commit()
+    invalidate_principal(user.id)
 
 def reset_fail_state(user: User) -> None:
     with SessionLocal() as s:
-        u = s.get(User, user.id)
-        if not u:
-            return
-        u.failed_attempts = 0
-        u.locked_until = None
-        u.updated_at = utc_now()
-        s.commit()
\ No newline at end of file
+        s.execute(
+            update(User)
+            .where(User.id == user.id)
+            .values(failed_attempts=0, locked_until=None, updated_at=utc_now())
+        )
+        s.commit()
+    invalidate_principal(user.id)
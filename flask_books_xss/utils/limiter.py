@@ -1,6 +1,25 @@
+import os
+
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from .limiter_storage import supported_strategies  # importing it registers the sqlite:// scheme
+
+# memory:// keeps counters per process, so every worker enforces its own copy
+# of each limit. Use sqlite:///<path> to share them between the workers on one
+# host, or redis://... / memcached://... for several hosts.
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+RATELIMIT_STRATEGY = os.getenv("RATELIMIT_STRATEGY", "sliding-window-counter")
+
+# Fail at startup rather than on the first rate-limited request.
+if RATELIMIT_STRATEGY not in supported_strategies(RATELIMIT_STORAGE_URI):
+    raise RuntimeError(
+        f"RATELIMIT_STRATEGY={RATELIMIT_STRATEGY} is not supported by {RATELIMIT_STORAGE_URI}; "
+        f"use one of: {', '.join(supported_strategies(RATELIMIT_STORAGE_URI))}"
+    )
+
 limiter = Limiter(
-    get_remote_address
-    )
\ No newline at end of file
+    get_remote_address,
+    storage_uri=RATELIMIT_STORAGE_URI,
+    strategy=RATELIMIT_STRATEGY,
+    )
@@ -0,0 +1,193 @@
+# utils/limiter_storage.py
+"""SQLite-backed storage for Flask-Limiter, shared by every worker on one host.
+
+Registered with `limits` under the ``sqlite`` scheme, so it is selected by
+URI like the built-in backends:
+
+    RATELIMIT_STORAGE_URI=sqlite:///instance/ratelimit.db    (relative)
+    RATELIMIT_STORAGE_URI=sqlite:////data/ratelimit.db       (absolute)
+
+Counters live in one WITHOUT ROWID table keyed by the limit key. A sliding
+window check reads both windows and increments in a single IMMEDIATE
+transaction, so concurrent workers never over-admit and never need the
+increment-then-revert dance of the in-memory backend. Expired rows are
+purged every RATELIMIT_SQLITE_PURGE_INTERVAL seconds, so the table only
+holds keys seen within the last two windows.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from pathlib import Path
+from typing import List, Tuple
+from urllib.parse import urlparse
+
+from limits.storage import SCHEMES, MovingWindowSupport, SlidingWindowCounterSupport, Storage
+from limits.storage.base import TimestampedSlidingWindow
+
+RATELIMIT_SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("RATELIMIT_SQLITE_BUSY_TIMEOUT_MS", "2000"))
+RATELIMIT_SQLITE_PURGE_INTERVAL = float(os.getenv("RATELIMIT_SQLITE_PURGE_INTERVAL", "60"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratelimit (
+    key     TEXT PRIMARY KEY,
+    value   INTEGER NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Starts a fresh counter when the stored one has expired, otherwise adds to it.
+_INCR = """
+INSERT INTO ratelimit (key, value, expires) VALUES (:key, :amount, :expires)
+ON CONFLICT (key) DO UPDATE SET
+    value   = CASE WHEN expires <= :now THEN :amount  ELSE value + :amount END,
+    expires = CASE WHEN expires <= :now THEN :expires ELSE expires END
+RETURNING value
+"""
+
+_fork_generation = 0
+
+
+def _after_fork() -> None:
+    # Connections opened by the parent must not be used by the child.
+    global _fork_generation
+    _fork_generation += 1
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Fixed-window and sliding-window-counter storage in a local SQLite file."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options) -> None:
+        path = uri[len("sqlite:///"):]
+        if not path or ":memory:" in path:
+            raise ValueError("sqlite rate limit storage needs a file path shared by all workers")
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.purge_interval = float(options.get("purge_interval", RATELIMIT_SQLITE_PURGE_INTERVAL))
+        self._local = threading.local()
+        self._next_purge = 0.0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._conn().execute(_SCHEMA)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _conn(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, "generation", None) != _fork_generation:
+            # Autocommit mode: single statements commit on their own, and
+            # multi-statement checks open an explicit IMMEDIATE transaction.
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={RATELIMIT_SQLITE_BUSY_TIMEOUT_MS}")
+            local.conn, local.generation = conn, _fork_generation
+        return local.conn
+
+    def _maybe_purge(self, conn: sqlite3.Connection, now: float) -> None:
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.purge_interval
+        conn.execute("DELETE FROM ratelimit WHERE expires <= ?", (now,))
+
+    def _get(self, conn: sqlite3.Connection, key: str, now: float) -> Tuple[int, float]:
+        row = conn.execute(
+            "SELECT value, expires FROM ratelimit WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        return row if row else (0, now)
+
+    # ---- Fixed window ----
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+        return conn.execute(_INCR, {"key": key, "amount": amount, "expires": now + expiry, "now": now}).fetchall()[0][0]
+
+    def get(self, key: str) -> int:
+        return self._get(self._conn(), key, time.time())[0]
+
+    def get_expiry(self, key: str) -> float:
+        return self._get(self._conn(), key, time.time())[1]
+
+    def clear(self, key: str) -> None:
+        self._conn().execute("DELETE FROM ratelimit WHERE key = ?", (key,))
+
+    def check(self) -> bool:
+        try:
+            self._conn().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._conn().execute("DELETE FROM ratelimit").rowcount
+
+    # ---- Sliding window counter ----
+    def _window(self, conn: sqlite3.Connection, key: str, expiry: int, now: float) -> Tuple[int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(conn, previous_key, now)[0]
+        current_count = self._get(conn, current_key, now)[0]
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        conn = self._conn()
+        self._maybe_purge(conn, now)
+
+        def over_limit() -> bool:
+            previous_count, previous_ttl, current_count, _ = self._window(conn, key, expiry, now)
+            return floor(previous_count * previous_ttl / expiry + current_count) + amount > limit
+
+        # Counters only grow within a window, so a rejection seen without the
+        # write lock stands; a flood of rejected requests never takes it.
+        if over_limit():
+            return False
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if over_limit():
+                conn.execute("COMMIT")
+                return False
+            # The current window's counter is still needed as the "previous"
+            # one during the next window, hence twice the expiry.
+            _, current_key = self.sliding_window_keys(key, expiry, now)
+            conn.execute(_INCR, {"key": current_key, "amount": amount, "expires": now + 2 * expiry, "now": now}).fetchall()
+            conn.execute("COMMIT")
+            return True
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._window(self._conn(), key, expiry, time.time())
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for k in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(k)
+
+
+# Strategies that need more than the base Storage API, and the mixin that provides it.
+_STRATEGY_NEEDS = {
+    "moving-window": MovingWindowSupport,
+    "sliding-window-counter": SlidingWindowCounterSupport,
+}
+
+
+def supported_strategies(storage_uri: str) -> List[str]:
+    """Flask-Limiter strategies the storage behind `storage_uri` implements."""
+    from limits.strategies import STRATEGIES
+    storage_cls = SCHEMES.get(urlparse(storage_uri).scheme)
+    if storage_cls is None:
+        raise RuntimeError(f"RATELIMIT_STORAGE_URI has an unknown scheme: {storage_uri!r}")
+    return sorted(name for name in STRATEGIES
+                  if name not in _STRATEGY_NEEDS or issubclass(storage_cls, _STRATEGY_NEEDS[name]))
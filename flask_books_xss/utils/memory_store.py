@@ -0,0 +1,114 @@
+# utils/memory_store.py
+"""Redis-compatible in-process store behind the page cache and TOTP replay backends."""
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class MemoryStore:
+    """In-process stand-in for the subset of the Redis client API we use.
+
+    Lets the shared backend run in tests and single-host setups without a server.
+    Expired keys are dropped when read and, like Redis's active expiry, by a
+    sweep every `sweep_interval` seconds, so keys nobody reads again (old page
+    generations, spent TOTP steps) don't accumulate.
+    """
+
+    def __init__(self, sweep_interval: float = 60) -> None:
+        self._data: Dict[str, Tuple[object, Optional[float]]] = {}
+        # Re-entrant so a pipeline can run its queued commands under one hold.
+        self._lock = threading.RLock()
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._data = {k: v for k, v in self._data.items() if v[1] is None or v[1] > now}
+        self._next_sweep = now + self.sweep_interval
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key: str):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        with self._lock:
+            self._sweep()
+            if nx and self._live(key) is not None:
+                return False
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._live(key) or 0) + 1
+            _, expires = self._data.get(key, (None, None))
+            self._data[key] = (value, expires)
+            return value
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            value = self._live(key)
+            if value is None:
+                return False
+            self._data[key] = (value, time.monotonic() + seconds)
+            return True
+
+    def zadd(self, key: str, mapping: Dict[str, float], gt: bool = False, ch: bool = False) -> int:
+        """Sorted-set ZADD with the GT and CH flags (Redis >= 6.2 semantics)."""
+        with self._lock:
+            self._sweep()
+            zset = self._live(key)
+            expires = self._data[key][1] if zset is not None else None
+            zset = dict(zset or {})
+            changed = 0
+            for member, score in mapping.items():
+                old = zset.get(member)
+                if old is None:
+                    changed += 1
+                elif score == old or (gt and score < old):
+                    continue
+                elif ch:
+                    changed += 1
+                zset[member] = score
+            self._data[key] = (zset, expires)
+            return changed
+
+    def pipeline(self, transaction: bool = True) -> "_Pipeline":
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    """Queues commands and runs them atomically on execute(), like MULTI/EXEC."""
+
+    def __init__(self, store: MemoryStore) -> None:
+        self._store = store
+        self._queued: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self) -> List:
+        with self._store._lock:
+            results = [getattr(self._store, name)(*args, **kwargs) for name, args, kwargs in self._queued]
+        self._queued.clear()
+        return results
@@ -1,4 +1,8 @@
 from datetime import datetime, timezone
 
 def utc_now():
-    return datetime.now(timezone.utc)
\ No newline at end of file
+    return datetime.now(timezone.utc)
+
+def as_utc(dt: datetime) -> datetime:
+    """SQLite hands back naive datetimes; treat them as the UTC they were stored as."""
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
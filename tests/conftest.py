@@ -0,0 +1,22 @@
+"""Runs the suite against a throwaway SQLite database.
+
+The package reads its configuration at import, so the environment is set
+here, before any test module imports it.
+"""
+from __future__ import annotations
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="tests-")
+os.chdir(_tmp)
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp}/test.db")
+os.environ.setdefault("PAGE_CACHE", "off")
+os.environ.setdefault("HASH_WORKERS", "0")
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    from flask_books_xss.schema import init_db
+    init_db()
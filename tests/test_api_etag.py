@@ -0,0 +1,36 @@
+"""API validators come from the database, not from the page cache."""
+from __future__ import annotations
+
+import pytest
+
+from flask_books_xss import create_app
+from flask_books_xss.listings import create_listing
+from flask_books_xss.page_cache import page_cache
+
+BASE_URL = "https://localhost"
+
+
+@pytest.fixture(scope="module")
+def client(schema):
+    return create_app().test_client()
+
+
+def _get(client, url, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return client.get(url, base_url=BASE_URL, headers=headers)
+
+
+@pytest.mark.parametrize("url", ["/api/listings", "/api/listings/stats", "/api/listings/search?q=book"])
+def test_unchanged_data_revalidates_with_304(client, url):
+    assert not page_cache.enabled
+    etag = _get(client, url).headers["ETag"]
+    assert _get(client, url).headers["ETag"] == etag
+    assert _get(client, url, etag).status_code == 304
+
+
+def test_listing_write_changes_the_etag(client):
+    etag = _get(client, "/api/listings").headers["ETag"]
+    create_listing(None, "Etag book", 5)
+    resp = _get(client, "/api/listings", etag)
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
@@ -0,0 +1,50 @@
+"""HashPool keeps a slot for every job still running, even after its caller gave up."""
+from __future__ import annotations
+import time
+
+import pytest
+
+from flask_books_xss.security import HashingBusy, HashPool
+
+
+def _slow_job(seconds: float):
+    started = time.monotonic()
+    time.sleep(seconds)
+    return "done", started, time.monotonic()
+
+
+def _wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def pool():
+    pool = HashPool(workers=1, queue_max=1, timeout=30)
+    assert pool.run(_slow_job, 0) == "done"   # start the worker before timeouts matter
+    pool.timeout = 0.2
+    yield pool
+    pool.reset()
+
+
+def test_timed_out_job_keeps_its_slot(pool):
+    with pytest.raises(HashingBusy):
+        pool.run(_slow_job, 1.0)
+    # The job is still running: its slot is taken, so a new caller is turned away.
+    assert pool.metrics()["queue_depth"] == 1
+    with pytest.raises(HashingBusy):
+        pool.run(_slow_job, 0)
+    assert pool.rejected == 1
+
+    _wait_for(lambda: pool.in_flight == 0)
+    assert pool.run(_slow_job, 0) == "done"
+
+
+def test_inline_pool_releases_on_error():
+    pool = HashPool(workers=0, queue_max=1)
+    with pytest.raises(TypeError):
+        pool.run(_slow_job)
+    assert pool.in_flight == 0
+    assert pool.run(_slow_job, 0) == "done"
@@ -0,0 +1,116 @@
+"""ProviderClient against a local fake provider: breaker, budget, overlap."""
+from __future__ import annotations
+import socket
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_oauth import FakeOAuthProvider
+from flask_books_xss import http_client
+from flask_books_xss.http_client import ProviderClient, ProviderUnavailable
+
+AUTH = {"Authorization": "Bearer tok-u1"}
+THRESHOLD = 3
+COOLDOWN = 0.3
+
+
+@pytest.fixture(autouse=True)
+def breaker(monkeypatch):
+    monkeypatch.setattr(http_client, "OAUTH_BREAKER_THRESHOLD", THRESHOLD)
+    monkeypatch.setattr(http_client, "OAUTH_BREAKER_COOLDOWN", COOLDOWN)
+
+
+@pytest.fixture
+def provider():
+    with FakeOAuthProvider() as p:
+        yield p
+
+
+@pytest.fixture
+def slow_provider():
+    with FakeOAuthProvider(delay=0.3) as p:
+        yield p
+
+
+@pytest.fixture
+def dead_url():
+    # A port nothing listens on: every call fails with a connection error.
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/user"
+
+
+def _deadline(seconds: float = 5.0) -> float:
+    return time.monotonic() + seconds
+
+
+def _trip(client: ProviderClient, url: str) -> None:
+    for _ in range(THRESHOLD):
+        with pytest.raises(ProviderUnavailable, match="ConnectionError"):
+            client.request("GET", url, _deadline())
+
+
+def test_breaker_opens_after_threshold_failures(provider, dead_url):
+    client = ProviderClient("test")
+    _trip(client, dead_url)
+    with pytest.raises(ProviderUnavailable, match="circuit open"):
+        client.request("GET", f"{provider.base_url}/user", _deadline(), headers=AUTH)
+    assert provider.hits == {}
+
+
+def test_half_open_lets_one_probe_through(slow_provider, dead_url):
+    client = ProviderClient("test")
+    _trip(client, dead_url)
+    time.sleep(COOLDOWN)
+
+    url = f"{slow_provider.base_url}/user"
+    probe = threading.Thread(target=client.request, args=("GET", url, _deadline()), kwargs={"headers": AUTH})
+    probe.start()
+    time.sleep(0.1)  # the probe is waiting on the provider
+    with pytest.raises(ProviderUnavailable, match="half-open"):
+        client.request("GET", url, _deadline(), headers=AUTH)
+    probe.join()
+
+    # The probe succeeded, so the circuit is closed again.
+    assert client.request("GET", url, _deadline(), headers=AUTH).status_code == 200
+    assert slow_provider.hits == {"user": 2}
+
+
+def test_failed_probe_reopens_the_circuit(provider, dead_url):
+    client = ProviderClient("test")
+    _trip(client, dead_url)
+    time.sleep(COOLDOWN)
+    with pytest.raises(ProviderUnavailable, match="ConnectionError"):
+        client.request("GET", dead_url, _deadline())
+    with pytest.raises(ProviderUnavailable, match="circuit open"):
+        client.request("GET", f"{provider.base_url}/user", _deadline(), headers=AUTH)
+
+
+def test_exhausted_budget_skips_the_call(provider):
+    client = ProviderClient("test")
+    with pytest.raises(ProviderUnavailable, match="time budget exhausted"):
+        client.request("GET", f"{provider.base_url}/user", time.monotonic() - 1, headers=AUTH)
+    assert provider.hits == {}
+
+
+def test_budget_caps_a_slow_response(slow_provider):
+    client = ProviderClient("test")
+    started = time.monotonic()
+    with pytest.raises(ProviderUnavailable, match="Timeout"):
+        client.request("GET", f"{slow_provider.base_url}/user", _deadline(0.1), headers=AUTH)
+    assert time.monotonic() - started < 0.3
+
+
+def test_userinfo_and_emails_are_fetched_concurrently(slow_provider):
+    client = ProviderClient("test")
+    deadline = _deadline()
+    started = time.monotonic()
+    emails = client.get_async(f"{slow_provider.base_url}/user/emails", deadline, headers=AUTH)
+    user = client.get_async(f"{slow_provider.base_url}/user", deadline, headers=AUTH)
+    assert user.result().json()["id"] == 1
+    assert emails.result().json()[0]["email"] == "gh1@example.test"
+    # Two 0.3 s responses, overlapped.
+    assert time.monotonic() - started < 0.5
+    assert slow_provider.hits == {"user": 1, "emails": 1}
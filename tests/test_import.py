@@ -0,0 +1,39 @@
+"""Bulk import skips bad rows without aborting the rows around them."""
+from __future__ import annotations
+import io
+
+from sqlalchemy import func, select
+
+from flask_books_xss.db import ReadSession
+from flask_books_xss.listings import import_listings
+from flask_books_xss.models.listing import Listing
+
+
+def _count(title: str) -> int:
+    with ReadSession() as s:
+        return s.scalar(select(func.count()).select_from(Listing).where(Listing.title == title))
+
+
+def test_bad_json_lines_are_reported_and_skipped():
+    fh = io.StringIO(
+        '{"title": "Import ok", "price": 5}\n'
+        '\n'
+        '{"title": "truncated\n'
+        '[1, 2]\n'
+        '"just a string"\n'
+        '{"title": "Import ok", "price": "x"}\n'
+        '{"title": "Import ok", "price": 7}\n'
+    )
+    errors = []
+    inserted, skipped = import_listings(fh, "jsonl", chunk_size=1,
+                                        on_error=lambda line_no, code: errors.append((line_no, code)))
+    assert (inserted, skipped) == (2, 4)
+    assert errors == [(3, "invalid_json"), (4, "not_an_object"), (5, "not_an_object"), (6, "price_must_be_int")]
+    assert _count("Import ok") == 2
+
+
+def test_csv_rows_are_numbered_from_one():
+    fh = io.StringIO("title,price\nCsv import,3\n,4\n")
+    errors = []
+    assert import_listings(fh, "csv", on_error=lambda *e: errors.append(e)) == (1, 1)
+    assert errors == [(2, "title_required")]
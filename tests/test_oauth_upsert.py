@@ -0,0 +1,59 @@
+"""Parallel first-time OAuth callbacks converge on one user and one link."""
+from __future__ import annotations
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import func, select
+
+from flask_books_xss.db import SessionLocal
+from flask_books_xss.models.user import OAuthAccount, User
+from flask_books_xss.oauth import upsert_oauth_account
+
+THREADS = 16
+
+
+def _login(account: str, token: str = "tok") -> int:
+    return upsert_oauth_account("github", account, f"gh{account}@example.test", token, None, None)
+
+
+def _counts(account: str):
+    with SessionLocal() as s:
+        users = s.scalar(select(func.count()).select_from(User).where(User.email == f"gh{account}@example.test"))
+        links = s.scalar(select(func.count()).select_from(OAuthAccount)
+                         .where(OAuthAccount.provider == "github", OAuthAccount.provider_user_id == account))
+    return users, links
+
+
+@pytest.mark.parametrize("round_", range(5))
+def test_parallel_callbacks_share_one_user_and_link(round_):
+    account = f"contend-{round_}"
+    barrier = threading.Barrier(THREADS)
+
+    def callback(_):
+        barrier.wait()
+        return _login(account)
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        ids = set(pool.map(callback, range(THREADS)))
+    assert len(ids) == 1
+    assert _counts(account) == (1, 1)
+
+
+def test_returning_login_refreshes_tokens():
+    user_id = _login("refresh", "tok-1")
+    assert _login("refresh", "tok-2") == user_id
+    with SessionLocal() as s:
+        token = s.scalar(select(OAuthAccount.access_token).where(OAuthAccount.provider_user_id == "refresh"))
+    assert token == "tok-2"
+    assert _counts("refresh") == (1, 1)
+
+
+def test_links_to_existing_user_with_the_same_email():
+    with SessionLocal() as s:
+        user = User(email="ghexisting@example.test", password_hash="x")
+        s.add(user)
+        s.commit()
+        user_id = user.id
+    assert _login("existing") == user_id
+    assert _counts("existing") == (1, 1)
@@ -0,0 +1,40 @@
+"""Generation-keyed page cache: a write makes every earlier page unreachable."""
+from __future__ import annotations
+
+import pytest
+
+from flask_books_xss.page_cache import LocalBackend, PageCache, StoreBackend
+from flask_books_xss.utils.memory_store import MemoryStore
+
+
+@pytest.fixture(params=["local", "store"])
+def cache(request):
+    backend = LocalBackend() if request.param == "local" else StoreBackend(MemoryStore())
+    return PageCache(backend)
+
+
+def test_hit_after_set(cache):
+    key = cache.key("anon", "")
+    assert cache.get(key) is None
+    cache.set(key, "page")
+    assert cache.get(cache.key("anon", "")) == "page"
+
+
+def test_invalidate_hides_cached_pages(cache):
+    cache.set(cache.key("anon", ""), "old")
+    cache.invalidate()
+    assert cache.get(cache.key("anon", "")) is None
+
+
+def test_render_racing_a_write_is_not_served(cache):
+    key = cache.key("anon", "")
+    assert cache.get(key) is None
+    cache.invalidate()              # a write commits while the page renders
+    cache.set(key, "stale")
+    assert cache.get(cache.key("anon", "")) is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PageCache(enabled=False)
+    cache.set(cache.key("anon"), "page")
+    assert cache.get(cache.key("anon")) is None
@@ -0,0 +1,51 @@
+"""Full-text search indexes stripped text and leaves `listing` writable by any client."""
+from __future__ import annotations
+import os
+import sqlite3
+
+from sqlalchemy import text
+
+from flask_books_xss.db import engine
+from flask_books_xss.listings import create_listing, update_listing
+from flask_books_xss.migrations import fill_plain_text
+from flask_books_xss.search import search_listings
+
+
+def _ids(q: str):
+    return {item["id"] for item in search_listings(q)["items"]}
+
+
+def _raw_connection() -> sqlite3.Connection:
+    # A plain sqlite3 connection: none of the app's connection setup.
+    return sqlite3.connect(os.environ["DATABASE_URL"].removeprefix("sqlite:///"))
+
+
+def test_markup_is_not_indexed():
+    row = create_listing(None, "<b>Zanzibar</b> atlas", 10,
+                         description='<a href="https://example.test">quixotic &amp; rare</a>')
+    assert _ids("zanzibar") == {row.id}
+    assert _ids("quixotic") == {row.id}
+    assert row.id not in _ids("href") | _ids("amp") | _ids("https")
+
+
+def test_update_reindexes_plain_text():
+    row = create_listing(None, "Xylophone primer", 10)
+    assert update_listing(None, row.id, title="<i>Marimba</i> primer")
+    assert _ids("xylophone") == set()
+    assert _ids("marimba") == {row.id}
+
+
+def test_other_clients_can_write_listing():
+    with _raw_connection() as db:
+        listing_id = db.execute(
+            "INSERT INTO listing (title, price, created_at) VALUES ('Raw <b>kumquat</b>', 1, '2024-01-01')"
+        ).lastrowid
+    try:
+        with engine.begin() as conn:
+            assert fill_plain_text(conn) >= 1
+            conn.execute(text("INSERT INTO listing_fts(listing_fts) VALUES ('rebuild')"))
+        assert _ids("kumquat") == {listing_id}
+    finally:
+        with _raw_connection() as db:
+            db.execute("DELETE FROM listing WHERE id = ?", (listing_id,))
+    assert _ids("kumquat") == set()
@@ -0,0 +1,57 @@
+"""TOTP codes work once, and never after a newer one was accepted."""
+from __future__ import annotations
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyotp
+import pytest
+
+from flask_books_xss import totp_replay
+from flask_books_xss.totp_replay import LocalReplayStore, SharedReplayStore, verify_once
+from flask_books_xss.utils.memory_store import MemoryStore
+
+
+@pytest.fixture(params=["local", "shared"])
+def store(request):
+    return LocalReplayStore() if request.param == "local" else SharedReplayStore(MemoryStore())
+
+
+def test_step_is_accepted_once(store):
+    assert store.claim(1, 100)
+    assert not store.claim(1, 100)
+    assert store.claim(2, 100)  # per user
+
+
+def test_older_step_rejected_after_newer(store):
+    assert store.claim(1, 101)
+    assert not store.claim(1, 100)
+    assert store.claim(1, 102)
+
+
+def test_backends_agree():
+    local, shared = LocalReplayStore(), SharedReplayStore(MemoryStore())
+    steps = [10, 10, 9, 11, 10, 12]
+    expected = [True, False, False, True, False, True]
+    assert [local.claim(7, s) for s in steps] == expected
+    assert [shared.claim(7, s) for s in steps] == expected
+
+
+def test_concurrent_claims_admit_one(store):
+    threads = 8
+    barrier = threading.Barrier(threads)
+
+    def claim(_):
+        barrier.wait()
+        return store.claim(1, 500)
+
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(claim, range(threads)))
+    assert results.count(True) == 1
+
+
+def test_verify_once(monkeypatch, store):
+    monkeypatch.setattr(totp_replay, "replay_store", store)
+    secret = pyotp.random_base32()
+    code = pyotp.TOTP(secret).now()
+    assert verify_once(1, secret, code)
+    assert not verify_once(1, secret, code)
@@ -0,0 +1,104 @@
+"""authenticate(): one read, at most one write, and no Argon2 for locked accounts."""
+from __future__ import annotations
+import datetime
+import itertools
+from contextlib import contextmanager
+
+import pytest
+from argon2 import PasswordHasher
+from sqlalchemy import event, select, update
+
+from flask_books_xss import users
+from flask_books_xss.db import SessionLocal, engine
+from flask_books_xss.models.user import User
+from flask_books_xss.security import needs_rehash
+from flask_books_xss.users import MAX_FAILED_ATTEMPTS, authenticate, create_user
+from flask_books_xss.utils.time import utc_now
+
+PASSWORD = "correct horse battery"
+_emails = (f"auth{n}@test.example" for n in itertools.count())
+
+
+@contextmanager
+def writes():
+    """Collects the INSERT/UPDATE/DELETE statements run on the write engine."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def _row(user_id: int):
+    with SessionLocal() as s:
+        return s.execute(
+            select(User.failed_attempts, User.locked_until, User.password_hash).where(User.id == user_id)
+        ).one()
+
+
+@pytest.fixture
+def user():
+    return create_user(next(_emails), PASSWORD)
+
+
+def test_locked_account_skips_argon2(user, monkeypatch):
+    with SessionLocal() as s:
+        s.execute(update(User).where(User.id == user.id)
+                  .values(locked_until=utc_now() + datetime.timedelta(minutes=5)))
+        s.commit()
+
+    def verify_password(*args):
+        pytest.fail("verify_password called for a locked account")
+
+    monkeypatch.setattr(users, "verify_password", verify_password)
+    with writes() as seen:
+        assert authenticate(user.email, PASSWORD) is None
+    assert seen == []
+
+
+def test_failures_lock_at_threshold(user):
+    for attempt in range(1, MAX_FAILED_ATTEMPTS + 1):
+        with writes() as seen:
+            assert authenticate(user.email, "wrong password") is None
+        assert len(seen) == 1
+        assert seen[0].lstrip().upper().startswith("UPDATE") and "RETURNING" in seen[0].upper()
+        failed, locked_until, _ = _row(user.id)
+        assert failed == attempt
+        assert (locked_until is not None) == (attempt == MAX_FAILED_ATTEMPTS)
+    # Locked now: even the right password is refused.
+    assert authenticate(user.email, PASSWORD) is None
+
+
+def test_clean_success_does_not_write(user):
+    with writes() as seen:
+        assert authenticate(user.email.upper(), PASSWORD).id == user.id
+    assert seen == []
+
+
+def test_success_clears_fail_state(user):
+    assert authenticate(user.email, "wrong password") is None
+    with writes() as seen:
+        assert authenticate(user.email, PASSWORD) is not None
+    assert len(seen) == 1
+    assert _row(user.id)[:2] == (0, None)
+
+
+def test_stale_hash_is_upgraded(user):
+    stale = PasswordHasher(memory_cost=8 * 1024, time_cost=1, parallelism=1).hash(PASSWORD)
+    assert needs_rehash(stale)
+    with SessionLocal() as s:
+        s.execute(update(User).where(User.id == user.id).values(password_hash=stale))
+        s.commit()
+
+    assert authenticate(user.email, PASSWORD) is not None
+    upgraded = _row(user.id)[2]
+    assert upgraded != stale and not needs_rehash(upgraded)
+    with writes() as seen:
+        assert authenticate(user.email, PASSWORD) is not None
+    assert seen == []